@@ -1,11 +1,13 @@
-import json
+import argparse
 import requests
 import time
 from tqdm import tqdm
 
+from stream_GeoJSON import read_feature_collection, write_features
+
 """
-This script fetches elevation data from the OpenTopoData API and updates a GeoJSON file 
-with missing elevation values for Points and LineStrings.
+This script fetches elevation data from the OpenTopoData API, or samples it offline from local DEM tiles
+(`dem_Elevation.py`), and updates a GeoJSON file with missing elevation values for Points and LineStrings.
 
 API Usage:
 - The API has a limited number of free queries.
@@ -13,11 +15,15 @@ API Usage:
   paying for additional queries, or using an alternative API.
 
 Functionality:
-1. Loads a GeoJSON file and identifies missing elevations.
-2. Sends batch requests (up to 100 coordinates at a time) to the API.
-3. Handles rate limits with exponential backoff.
-4. Assigns elevation to Point features and ensures LineStrings have list of elevation for every coordinate.
-5. Saves the updated GeoJSON file.
+1. Streams the features of a GeoJSON file (`stream_GeoJSON.py`) and identifies missing elevations.
+2. Sends batch requests (up to 100 coordinates at a time) to the API and handles rate limits with exponential
+   backoff, or with --dem samples batches of 65536 coordinates at once from the DEM tiles.
+3. Backends are classes with a `batch_size` and an `elevations(lons, lats)` method returning a list of
+   elevations (None where unknown), passed to `add_elevation` as provider.
+4. Fetched elevations are kept in a persistent cache (`elevation_Cache.py`, default "elevation_cache.sqlite"),
+   which deduplicates shared coordinates and lets an interrupted run continue where it stopped.
+5. Assigns elevation to Point features and ensures LineStrings have list of elevation for every coordinate.
+6. Writes every feature to the compact output file as soon as its elevations are complete.
 
 Input:
 - "InputDirectory/autobahn_und_bundesstrassen_deutschland_no_elevation.geojson"
@@ -25,7 +31,10 @@ Input:
 Output:
 - "OutputDirectory/autobahn_und_bundesstrassen_deutschland_with_elevation.geojson"
 
-Run the script to process the input file and generate an updated version with elevation data.
+Run the script to process the input file and generate an updated version with elevation data:
+- python add_Elevation.py                      # OpenTopoData API
+- python add_Elevation.py --dem DEM_Directory  # offline from local GeoTIFF or raw DEM tiles
+- python add_Elevation.py --no-cache           # without the persistent elevation cache
 """
 
 
@@ -38,6 +47,7 @@ ELEVATION_API_URL = "https://api.opentopodata.org/v1/eudem25m"
 # FILE PATHS
 INPUT_FILE = "InputDirectory/autobahn_und_bundesstrassen_deutschland_no_elevation.geojson"
 OUTPUT_FILE = "OutputDirectory/autobahn_und_bundesstrassen_deutschland_with_elevation.geojson"
+CACHE_FILE = "elevation_cache.sqlite"
 
 # API SETTINGS
 BATCH_SIZE = 100  # Max batch size supported by API
@@ -45,12 +55,6 @@ INITIAL_WAIT_TIME = 2
 MAX_WAIT_TIME = 60
 
 
-def load_geojson(file_path):
-    """Load a GeoJSON file."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
-
-
 def fetch_elevation_batch(coordinates_batch):
     """Fetch elevation for a batch of coordinates."""
     url = f"{ELEVATION_API_URL}?locations={'|'.join(coordinates_batch)}"
@@ -77,57 +81,81 @@ def fetch_elevation_batch(coordinates_batch):
             time.sleep(wait_time)
 
 
-def process_features(geojson_data):
-    """Ensure all features have elevation and process LineStrings completely."""
-    features = geojson_data.get("features", [])
+class ApiElevationProvider:
+    """Elevation backend on the OpenTopoData API."""
 
-    coordinates_batch = []
-    coordinate_mapping = []  # To map each coordinate back to its feature and index
+    batch_size = BATCH_SIZE
+    source = ELEVATION_API_URL
 
-    for feature in tqdm(features, desc="Processing Features"):
-        geometry = feature.get("geometry")
+    def elevations(self, lons, lats):
+        return fetch_elevation_batch([f"{lat},{lon}" for lon, lat in zip(lons, lats)])
 
-        # Skip if no geometry exists
-        if not geometry:
-            continue
 
-        # Process Points
-        if geometry["type"] == "Point":
-            lon, lat = geometry["coordinates"]
-            elevation = feature["properties"].get("elevation")
+def missing_elevations(feature):
+    """Yield the (lon, lat) and target index (None for Points) of every coordinate without elevation."""
+    geometry = feature.get("geometry")
 
-            if elevation is None or not isinstance(elevation, (int, float)):
-                coordinates_batch.append(f"{lat},{lon}")
-                coordinate_mapping.append((feature, None))  # No index needed for Points
+    # Skip if no geometry exists
+    if not geometry:
+        return
 
-        # Process LineStrings
-        elif geometry["type"] == "LineString":
-            coordinates = geometry["coordinates"]
+    # Process Points
+    if geometry["type"] == "Point":
+        lon, lat = geometry["coordinates"]
+        elevation = feature["properties"].get("elevation")
 
-            # Ensure we have an elevation list for every coordinate
-            if "elevation" not in feature["properties"]:
-                feature["properties"]["elevation"] = [None] * len(coordinates)
+        if elevation is None or not isinstance(elevation, (int, float)):
+            yield (lon, lat), None  # No index needed for Points
 
-            for idx, (lon, lat) in enumerate(coordinates):
-                if feature["properties"]["elevation"][idx] is None:
-                    coordinates_batch.append(f"{lat},{lon}")
-                    coordinate_mapping.append((feature, idx))
+    # Process LineStrings
+    elif geometry["type"] == "LineString":
+        coordinates = geometry["coordinates"]
 
-                # Process batch when limit is reached
-                if len(coordinates_batch) >= BATCH_SIZE:
-                    update_elevations(coordinates_batch, coordinate_mapping)
-                    coordinates_batch, coordinate_mapping = [], []
+        # Ensure we have an elevation list for every coordinate
+        if "elevation" not in feature["properties"]:
+            feature["properties"]["elevation"] = [None] * len(coordinates)
+
+        for idx, (lon, lat) in enumerate(coordinates):
+            if feature["properties"]["elevation"][idx] is None:
+                yield (lon, lat), idx
+
+
+def add_elevation(features, provider=None):
+    """
+    Stream features and fill in their missing elevations from the provider (default: the API).
+
+    Coordinates are collected across features into batches of the batch size of the provider. A feature is yielded
+    as soon as all of its coordinates were fetched, so at most the features of one batch are held back at a time.
+    """
+    provider = provider or ApiElevationProvider()
+    coordinates_batch = []
+    coordinate_mapping = []  # To map each coordinate back to its feature and index
+    completed = []  # Features whose missing coordinates are all in fetched batches
+
+    for feature in features:
+        for coordinate, idx in missing_elevations(feature):
+            coordinates_batch.append(coordinate)
+            coordinate_mapping.append((feature, idx))
+
+            # Process batch when limit is reached
+            if len(coordinates_batch) >= provider.batch_size:
+                update_elevations(coordinates_batch, coordinate_mapping, provider)
+                coordinates_batch, coordinate_mapping = [], []
+                yield from completed
+                completed = []
+
+        completed.append(feature)
 
     # Process any remaining batch
     if coordinates_batch:
-        update_elevations(coordinates_batch, coordinate_mapping)
-
-    return geojson_data
+        update_elevations(coordinates_batch, coordinate_mapping, provider)
+    yield from completed
 
 
-def update_elevations(coordinates_batch, coordinate_mapping):
-    """Fetch and update elevations for a batch of coordinates."""
-    elevations = fetch_elevation_batch(coordinates_batch)
+def update_elevations(coordinates_batch, coordinate_mapping, provider):
+    """Fetch and update elevations for a batch of (lon, lat) coordinates."""
+    lons, lats = zip(*coordinates_batch)
+    elevations = provider.elevations(lons, lats)
 
     for (feature, idx), elevation in zip(coordinate_mapping, elevations):
         if idx is None:
@@ -136,21 +164,47 @@ def update_elevations(coordinates_batch, coordinate_mapping):
             feature["properties"]["elevation"][idx] = elevation  # LineString elevation
 
 
-def save_geojson(geojson_data, output_file):
-    """Save updated GeoJSON with complete elevation data."""
-    with open(output_file, "w", encoding="utf-8") as file:
-        json.dump(geojson_data, file, indent=4)
+def create_provider(dem_paths=None, cache_path=CACHE_FILE):
+    """The DEM backend if DEM files or directories are given, otherwise the API, behind the cache if a path is given."""
+    if dem_paths:
+        # numpy is only needed for the DEM backend
+        from dem_Elevation import DemElevationProvider
+        provider = DemElevationProvider(dem_paths)
+    else:
+        provider = ApiElevationProvider()
+    if cache_path:
+        from elevation_Cache import CachedElevationProvider
+        provider = CachedElevationProvider(provider, cache_path)
+    return provider
 
-    print(f"Final output saved as: {output_file}")
+
+def add_provider_arguments(parser):
+    parser.add_argument("--dem", nargs="+", help="DEM files or directories to sample offline instead of the API")
+    parser.add_argument("--cache", default=CACHE_FILE, help=f"Elevation cache file (default: {CACHE_FILE})")
+    parser.add_argument("--no-cache", dest="cache", action="store_const", const=None, help="Do not use the cache")
+
+
+def print_cache_statistics(provider):
+    if hasattr(provider, "hits"):
+        print(f"Elevation cache: {provider.hits} coordinates from the cache or duplicates, {provider.misses} fetched")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Add missing elevations to a GeoJSON road network.")
+    parser.add_argument("input_path", nargs="?", default=INPUT_FILE, help="Path to the input GeoJSON file")
+    parser.add_argument("output_path", nargs="?", default=OUTPUT_FILE, help="Path to the output GeoJSON file")
+    add_provider_arguments(parser)
+    args = parser.parse_args()
+
     print("🔍 Starting elevation processing...")
-    geojson_data = load_geojson(INPUT_FILE)
+    header, features = read_feature_collection(args.input_path)
 
-    updated_geojson = process_features(geojson_data)
+    provider = create_provider(args.dem, args.cache)
+    count = write_features(args.output_path, add_elevation(tqdm(features, desc="Processing Features"), provider),
+                           header)
 
-    save_geojson(updated_geojson, OUTPUT_FILE)
+    print_cache_statistics(provider)
+    print(f"Final output with {count} features saved as: {args.output_path}")
 
 
 if __name__ == "__main__":
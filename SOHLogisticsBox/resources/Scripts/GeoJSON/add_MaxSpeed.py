@@ -1,7 +1,4 @@
-import osmnx as ox
-import geopandas as gpd
-import pandas as pd
-import json
+from stream_GeoJSON import read_feature_collection, read_features, write_features
 
 """
 This script downloads Germany's motorway and primary road network from OpenStreetMap using OSMnx,
@@ -30,7 +27,6 @@ additional_tags = [
     "maxheight", "maxlength", "surface",
     "maxweight", "maxwidth", "incline", "maxspeed"
 ]
-ox.settings.useful_tags_way += additional_tags
 
 # Filter for main road types only
 custom_filter = '["highway"~"motorway|trunk|primary"]'
@@ -46,36 +42,47 @@ osm_speed_defaults = {
     'living_street': 7
 }
 
+geojson_with_maxspeed_path = "autobahn_und_bundesstrassen_with_maxspeed.geojson"
+input_path = "autobahn_und_bundesstrassen_deutschland_elevation_05.geojson"
+output_path_final = "autobahn_und_bundesstrassen_deutschland_elevation_06.geojson"
+
 # ============================================
 # 🛰️ Step 1: Download and process OSM road network
 # ============================================
 
-print("📥 Downloading road network from OSM...")
+def download_network(output_path):
+    """Download the road network with its maxspeed values and save nodes and edges as one GeoJSON."""
+    # OSMnx is only needed for the download, merging works with a previously saved network
+    import osmnx as ox
+    import pandas as pd
 
-all_roads = ox.graph_from_place(
-    ["Germany"],
-    network_type="drive",
-    custom_filter=custom_filter,
-    simplify=True
-)
+    ox.settings.useful_tags_way += additional_tags
 
-# Extract nodes and edges from graph
-gdf_nodes = ox.graph_to_gdfs(all_roads, edges=False, nodes=True)
-gdf_edges = ox.graph_to_gdfs(all_roads, edges=True, nodes=False)
+    print("📥 Downloading road network from OSM...")
 
-# Add type labels
-gdf_nodes["type"] = "node"
-gdf_edges["type"] = "edge"
+    all_roads = ox.graph_from_place(
+        ["Germany"],
+        network_type="drive",
+        custom_filter=custom_filter,
+        simplify=True
+    )
 
-# Combine into single GeoDataFrame
-gdf_combined = pd.concat([gdf_nodes, gdf_edges], ignore_index=True)
+    # Extract nodes and edges from graph
+    gdf_nodes = ox.graph_to_gdfs(all_roads, edges=False, nodes=True)
+    gdf_edges = ox.graph_to_gdfs(all_roads, edges=True, nodes=False)
 
-# Save combined GeoJSON (including 'maxspeed')
-geojson_with_maxspeed_path = "autobahn_und_bundesstrassen_with_maxspeed.geojson"
-print(f"💾 Saving to {geojson_with_maxspeed_path}...")
-gdf_combined.to_file(geojson_with_maxspeed_path, driver="GeoJSON")
+    # Add type labels
+    gdf_nodes["type"] = "node"
+    gdf_edges["type"] = "edge"
 
-print("✅ Step 1 Done. Network saved with maxspeed included.")
+    # Combine into single GeoDataFrame
+    gdf_combined = pd.concat([gdf_nodes, gdf_edges], ignore_index=True)
+
+    # Save combined GeoJSON (including 'maxspeed')
+    print(f"💾 Saving to {output_path}...")
+    gdf_combined.to_file(output_path, driver="GeoJSON")
+
+    print("✅ Step 1 Done. Network saved with maxspeed included.")
 
 # ============================================
 # 🧮 Step 2: Combine old dataset with maxspeed
@@ -97,25 +104,19 @@ def extract_valid_maxspeed(value):
     except:
         return None
 
-# Load new data with maxspeed values
-with open(geojson_with_maxspeed_path, "r", encoding="utf-8") as f:
-    new_data = json.load(f)
-
-# Load old data (with elevation, geometry, etc.)
-with open("autobahn_und_bundesstrassen_deutschland_elevation_05.geojson", "r", encoding="utf-8") as f:
-    old_data = json.load(f)
-
-# Build lookup table: osmid → maxspeed
-maxspeed_lookup = {}
-for feature in new_data["features"]:
-    props = feature.get("properties", {})
-    osmid = normalize_osmid(props.get("osmid"))
-    maxspeed = extract_valid_maxspeed(props.get("maxspeed"))
-    if osmid and maxspeed:
-        maxspeed_lookup[osmid] = maxspeed
-
-# Merge maxspeed into the old dataset
-for feature in old_data["features"]:
+def load_maxspeed_lookup(path):
+    """Build lookup table: osmid → maxspeed from the downloaded network."""
+    maxspeed_lookup = {}
+    for feature in read_features(path):
+        props = feature.get("properties", {})
+        osmid = normalize_osmid(props.get("osmid"))
+        maxspeed = extract_valid_maxspeed(props.get("maxspeed"))
+        if osmid and maxspeed:
+            maxspeed_lookup[osmid] = maxspeed
+    return maxspeed_lookup
+
+def assign_maxspeed(feature, maxspeed_lookup):
+    """Set the real maxspeed of a feature, or a default based on its highway type."""
     props = feature.get("properties", {})
     osmid = normalize_osmid(props.get("osmid"))
     assigned_speed = maxspeed_lookup.get(osmid)
@@ -132,10 +133,18 @@ for feature in old_data["features"]:
         props["maxspeed"] = assigned_speed
 
     feature["properties"] = props
+    return feature
+
+def main():
+    download_network(geojson_with_maxspeed_path)
+    maxspeed_lookup = load_maxspeed_lookup(geojson_with_maxspeed_path)
+
+    # Stream old data (with elevation, geometry, etc.), merge maxspeed and save the enriched dataset
+    header, features = read_feature_collection(input_path)
+    write_features(output_path_final, (assign_maxspeed(feature, maxspeed_lookup) for feature in features), header)
+
+    print(f"✅ Step 2 Done. Merged maxspeed saved to {output_path_final}.")
 
-# Save the enriched dataset
-output_path_final = "autobahn_und_bundesstrassen_deutschland_elevation_06.geojson"
-with open(output_path_final, "w", encoding="utf-8") as f:
-    json.dump(old_data, f, indent=2, ensure_ascii=False)
 
-print(f"✅ Step 2 Done. Merged maxspeed saved to {output_path_final}.")
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,7 @@ Output:
 - autobahn_mit_kapazitaet.geojson
 """
 
-import json
+from stream_GeoJSON import read_feature_collection, write_features
 
 # Konfiguration
 input_geojson = "autobahn_und_bundesstrassen_deutschland_elevation_06.geojson"
@@ -48,16 +48,16 @@ def assign_capacity_from_property(feature, default_lanes=1):
     feature["properties"] = props
     return feature
 
-# Lade GeoJSON
-with open(input_geojson, "r", encoding="utf-8") as f:
-    data = json.load(f)
+def main():
+    # Lese GeoJSON Feature für Feature
+    header, features = read_feature_collection(input_geojson)
 
-# Verarbeite Features
-for i, feature in enumerate(data["features"]):
-    assign_capacity_from_property(feature)
+    # Verarbeite Features und speichere neue GeoJSON
+    write_features(output_geojson, (assign_capacity_from_property(feature, default_lanes) for feature in features),
+                   header)
 
-# Speichere neue GeoJSON
-with open(output_geojson, "w", encoding="utf-8") as f:
-    json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"✅ Done. 'capacity_fe' added to edges and saved to: {output_geojson}")
 
-print(f"✅ Done. 'capacity_fe' added to edges and saved to: {output_geojson}")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,26 @@
-import json
 import math
 
+from stream_GeoJSON import read_feature_collection, write_features
+
 
 """
 This script calculates the maximum incline percentage for each feature in a GeoJSON file 
 based on elevation and coordinate data, then updates the file with the computed values.
 
 Functionality:
-1. Reads a GeoJSON file containing road network data with elevation values.
+1. Streams the features of a GeoJSON file containing road network data with elevation values.
 2. Calculates the maximum incline for each feature:
    - Uses the Haversine formula to determine segment distances.
    - Computes incline percentages based on elevation differences.
    - Ignores invalid or missing elevation data.
-3. Updates the GeoJSON file with the calculated incline values.
-4. Saves the modified GeoJSON file.
+3. Updates the features with the calculated incline values.
+4. Writes them to a compact GeoJSON file one at a time.
 
 Methods:
 - `haversine_distance(coord1, coord2)`: Computes the distance between two latitude/longitude coordinates.
 - `clean_elevations(elevations)`: Converts elevation values to floats and removes invalid entries.
 - `calculate_max_incline(elevations, coordinates)`: Determines the steepest incline percentage in a given set of points.
+- `add_incline(feature)`: Sets the incline of a single feature, used by the network pipeline.
 - `process_geojson(input_geojson, output_geojson)`: Reads, processes, and writes the updated GeoJSON file.
 
 Input:
@@ -81,48 +83,44 @@ def calculate_max_incline(elevations, coordinates):
 
     return max_incline
 
-def process_geojson(input_geojson, output_geojson):
-    """Read GeoJSON, calculate missing inclines, and write updated GeoJSON."""
-    with open(input_geojson, "r", encoding="utf-8") as file:
-        data = json.load(file)
+def add_incline(feature):
+    """Calculate the incline of a feature from its elevations if it is not set yet."""
+    properties = feature.get("properties", {})
+    geometry = feature.get("geometry", {})
 
-    for feature in data.get("features", []):
-        properties = feature.get("properties", {})
-        geometry = feature.get("geometry", {})
+    # Check if incline is null and needs to be calculated
+    if "incline" in properties and properties["incline"] is not None:
+        return feature  # Skip features where incline is already set
 
-        # Check if incline is null and needs to be calculated
-        if "incline" in properties and properties["incline"] is not None:
-            continue  # Skip features where incline is already set
+    # Extract elevations and coordinates
+    elevations = properties.get("elevation", [])
+    coordinates = geometry.get("coordinates", [])
 
-        # Extract elevations and coordinates
-        elevations = properties.get("elevation", [])
-        coordinates = geometry.get("coordinates", [])
+    # Ensure valid data
+    if not isinstance(elevations, list) or not isinstance(coordinates, list) or len(elevations) != len(coordinates):
+        return feature
 
-        # Ensure valid data
-        if not isinstance(elevations, list) or not isinstance(coordinates, list) or len(elevations) != len(coordinates):
-            continue
+    # Ensure each coordinate is a valid tuple
+    coordinates = [tuple(coord) for coord in coordinates if isinstance(coord, list) and len(coord) == 2]
 
-        # Ensure each coordinate is a valid tuple
-        coordinates = [tuple(coord) for coord in coordinates if isinstance(coord, list) and len(coord) == 2]
-
-        # Skip if coordinates are still invalid
-        if len(coordinates) != len(elevations):
-            continue
+    # Skip if coordinates are still invalid
+    if len(coordinates) != len(elevations):
+        return feature
 
-        # Calculate max incline
-        max_incline = calculate_max_incline(elevations, coordinates)
+    # Calculate max incline and update the feature with it
+    properties["incline"] = calculate_max_incline(elevations, coordinates)
+    return feature
 
-        # Update the feature with the calculated incline
-        properties["incline"] = max_incline
-
-    # Write updated GeoJSON
-    with open(output_geojson, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4, ensure_ascii=False)
-
-# Paths, change according to needed in- and output files
-input_geojson = "InputDirectory/autobahn_und_bundesstrassen_deutschland.geojson" 
-output_geojson = "OutputDirectory/autobahn_und_bundesstrassen_deutschland_calculated_incline.geojson"
-
-# Run the function
-process_geojson(input_geojson, output_geojson)
-print("Processing complete. Updated GeoJSON saved.")
+def process_geojson(input_geojson, output_geojson):
+    """Stream GeoJSON features, calculate missing inclines, and write updated GeoJSON."""
+    header, features = read_feature_collection(input_geojson)
+    write_features(output_geojson, (add_incline(feature) for feature in features), header)
+
+if __name__ == "__main__":
+    # Paths, change according to needed in- and output files
+    input_geojson = "InputDirectory/autobahn_und_bundesstrassen_deutschland.geojson"
+    output_geojson = "OutputDirectory/autobahn_und_bundesstrassen_deutschland_calculated_incline.geojson"
+
+    # Run the function
+    process_geojson(input_geojson, output_geojson)
+    print("Processing complete. Updated GeoJSON saved.")
@@ -1,4 +1,4 @@
-import json
+from stream_GeoJSON import read_feature_collection, write_features
 
 
 """
@@ -6,8 +6,8 @@ This script compresses a GeoJSON file by removing unnecessary whitespace and ind
 reducing its file size while maintaining its structure and readability for parsers.
 
 Processing steps:
-1. Load the original GeoJSON file.
-2. Write a new GeoJSON file in a compact format:
+1. Stream the features of the original GeoJSON file (`stream_GeoJSON.py`).
+2. Write them to a new GeoJSON file in a compact format:
    - No indentation or extra spaces.
    - Uses minimal separators (`,` and `:`).
    - Preserves non-ASCII characters.
@@ -21,17 +21,14 @@ Example:
 """
 
 def compact_geojson(input_file, output_file):
-    # Read the original GeoJSON file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # Stream the original GeoJSON file into the compact version without indentation or extra spaces
+    header, features = read_feature_collection(input_file)
+    write_features(output_file, features, header)
 
-    # Write the compact version without indentation or extra spaces
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
 
+if __name__ == "__main__":
+    # Example usage
+    input_geojson = "InputDirectory/autobahn_und_bundesstrassen_deutschland.geojson"  # Replace with your actual input file
+    output_geojson = 'OutputDirectory/autobahn_und_bundesstrassen_deutschland_compressed.geojson'  # The compact output file
 
-# Example usage
-input_geojson = "InputDirectory/autobahn_und_bundesstrassen_deutschland.geojson"  # Replace with your actual input file
-output_geojson = 'OutputDirectory/autobahn_und_bundesstrassen_deutschland_compressed.geojson'  # The compact output file
-
-compact_geojson(input_geojson, output_geojson)
+    compact_geojson(input_geojson, output_geojson)
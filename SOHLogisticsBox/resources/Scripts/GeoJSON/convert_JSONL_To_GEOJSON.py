@@ -1,5 +1,6 @@
 import argparse
-import json
+
+from stream_GeoJSON import read_features, write_features
 
 """
 This script converts a JSON Lines (JSONL) file into a standard GeoJSON FeatureCollection.
@@ -11,9 +12,8 @@ Purpose:
 - The script wraps all individual features into a single `FeatureCollection` object.
 
 Functionality:
-1. Load all features from the input JSONL file (one per line).
-2. Combine them into a GeoJSON FeatureCollection.
-3. Save the resulting object to a .geojson file for use in GIS tools.
+1. Stream the features from the input JSONL file (one per line).
+2. Write them one by one into a compact GeoJSON FeatureCollection for use in GIS tools.
 
 Input:
 - A JSONL file where each line is a valid GeoJSON feature.
@@ -29,19 +29,7 @@ Example:
 
 def convert_jsonl_to_geojson(input_path, output_path):
     """Converts a JSONL file with GeoJSON features into a standard GeoJSON FeatureCollection."""
-    # Load all features from the input file
-    with open(input_path, "r", encoding="utf-8") as infile:
-        features = [json.loads(line) for line in infile]
-
-    # Create a valid GeoJSON FeatureCollection
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-
-    # Save the FeatureCollection to the output file
-    with open(output_path, "w", encoding="utf-8") as outfile:
-        json.dump(geojson, outfile, indent=2)
+    write_features(output_path, read_features(input_path))
 
     print(f"GeoJSON gespeichert unter: {output_path}")
 
@@ -0,0 +1,320 @@
+import os
+import struct
+
+import numpy as np
+
+"""
+This module samples elevations offline from local DEM (digital elevation model) tiles, as a backend of
+`add_Elevation.py` instead of the rate-limited OpenTopoData API.
+
+Supported tiles:
+- Uncompressed GeoTIFF (also BigTIFF), stored in strips or tiles, e.g. Copernicus DEM or SRTM tiles.
+  Compressed files can be converted with `gdal_translate -co COMPRESS=NONE in.tif out.tif`.
+- Raw grids with an ESRI header (`.hdr` next to a `.bil`, `.flt`, `.bin` or `.raw` file), either in the BIL
+  style (NROWS, NCOLS, NBITS, PIXELTYPE, ULXMAP, ULYMAP, XDIM, YDIM) or the GridFloat style (ncols, nrows,
+  xllcorner, yllcorner, cellsize).
+
+The tiles have to be in WGS84 longitude/latitude (EPSG:4326). DEMs in other projections (e.g. EU-DEM in EPSG:3035)
+can be reprojected with `gdalwarp -t_srs EPSG:4326`.
+
+Functionality:
+1. The pixels of every tile are memory mapped, nothing is read until a coordinate falls into the tile, and then
+   only the pages of the four neighbouring pixels are loaded by the operating system.
+2. Whole arrays of coordinates are sampled at once with bilinear interpolation between the four pixel centers
+   around each coordinate. Pixels with the nodata value are left out of the interpolation.
+3. Coordinates outside of all tiles or surrounded by nodata only get no elevation (None).
+
+Example:
+- provider = DemElevationProvider(["dem/"])
+- provider.elevations([9.99, 10.01], [53.55, 53.56])  # -> [6.12, 8.4]
+"""
+
+# TIFF field types: struct format of one value
+TIFF_TYPES = {1: "B", 2: "s", 3: "H", 4: "I", 5: "II", 6: "b", 7: "B", 8: "h", 9: "i", 10: "ii", 11: "f", 12: "d",
+              16: "Q", 17: "q"}
+
+# TIFF tags
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+PLANAR_CONFIGURATION = 284
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+SAMPLE_FORMAT = 339
+MODEL_PIXEL_SCALE = 33550
+MODEL_TIEPOINT = 33922
+MODEL_TRANSFORMATION = 34264
+GEO_KEY_DIRECTORY = 34735
+GDAL_NODATA = 42113
+
+RASTER_TYPE_GEO_KEY = 1025
+RASTER_PIXEL_IS_POINT = 2
+
+RAW_EXTENSIONS = (".bil", ".flt", ".bin", ".raw")
+
+
+def _dtype(bits, sample_format, byte_order):
+    kind = {1: "u", 2: "i", 3: "f"}.get(sample_format)
+    if kind is None or bits % 8:
+        raise ValueError(f"Unsupported DEM sample format {sample_format} with {bits} bits")
+    return np.dtype(f"{byte_order}{kind}{bits // 8}")
+
+
+def _read_tiff_tags(file):
+    """Return the byte order and the tags of the first image of a TIFF file as a dictionary tag → values."""
+    header = file.read(16)
+    byte_order = {b"II": "<", b"MM": ">"}.get(header[:2])
+    if byte_order is None:
+        raise ValueError("Not a TIFF file")
+    version = struct.unpack(byte_order + "H", header[2:4])[0]
+    if version == 42:
+        ifd_offset = struct.unpack(byte_order + "I", header[4:8])[0]
+        count_format, entry_format, inline_size = "H", "HHI", 4
+    elif version == 43:  # BigTIFF
+        ifd_offset = struct.unpack(byte_order + "Q", header[8:16])[0]
+        count_format, entry_format, inline_size = "Q", "HHQ", 8
+    else:
+        raise ValueError(f"Unsupported TIFF version {version}")
+
+    file.seek(ifd_offset)
+    count_size = struct.calcsize(count_format)
+    entry_count = struct.unpack(byte_order + count_format, file.read(count_size))[0]
+    entry_size = struct.calcsize("=" + entry_format) + inline_size
+    entries = file.read(entry_count * entry_size)
+
+    tags = {}
+    for index in range(entry_count):
+        entry = entries[index * entry_size:(index + 1) * entry_size]
+        tag, field_type, count = struct.unpack(byte_order + entry_format, entry[:-inline_size])
+        if field_type not in TIFF_TYPES:
+            continue
+        value_format = byte_order + TIFF_TYPES[field_type] * count if field_type != 2 else f"{count}s"
+        size = struct.calcsize(value_format)
+        if size <= inline_size:
+            data = entry[-inline_size:][:size]
+        else:
+            offset = struct.unpack(byte_order + ("I" if inline_size == 4 else "Q"), entry[-inline_size:])[0]
+            position = file.tell()
+            file.seek(offset)
+            data = file.read(size)
+            file.seek(position)
+        values = struct.unpack(value_format, data)
+        tags[tag] = values[0].rstrip(b"\0").decode("ascii", "replace") if field_type == 2 else values
+    return byte_order, tags
+
+
+class DemTile:
+    """
+    One memory mapped DEM raster. The pixels are stored in blocks (the strips or tiles of a TIFF, a single block
+    for raw grids) of block_width x block_height pixels, at the given byte offsets in the file.
+    """
+
+    def __init__(self, path, width, height, dtype, origin_x, origin_y, pixel_width, pixel_height, block_offsets,
+                 block_width, block_height, pixel_stride=None, nodata=None):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.dtype = dtype
+        # Upper left corner of the upper left pixel and the pixel size in degrees
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.pixel_width = pixel_width
+        self.pixel_height = pixel_height
+        self.block_offsets = np.asarray(block_offsets, dtype=np.int64)
+        self.block_width = block_width
+        self.block_height = block_height
+        self.blocks_across = -(-width // block_width)
+        self.pixel_stride = pixel_stride or dtype.itemsize
+        self.nodata = nodata
+        self._bytes = np.memmap(path, dtype=np.uint8, mode="r")
+
+    @property
+    def bounds(self):
+        """(min lon, min lat, max lon, max lat) of the tile."""
+        return (self.origin_x, self.origin_y - self.height * self.pixel_height,
+                self.origin_x + self.width * self.pixel_width, self.origin_y)
+
+    @classmethod
+    def from_geotiff(cls, path):
+        with open(path, "rb") as file:
+            byte_order, tags = _read_tiff_tags(file)
+
+        if tags.get(COMPRESSION, (1,))[0] != 1:
+            raise ValueError(f"{path} is compressed, convert it with gdal_translate -co COMPRESS=NONE")
+        width, height = tags[IMAGE_WIDTH][0], tags[IMAGE_LENGTH][0]
+        dtype = _dtype(tags[BITS_PER_SAMPLE][0], tags.get(SAMPLE_FORMAT, (1,))[0], byte_order)
+        samples = tags.get(SAMPLES_PER_PIXEL, (1,))[0]
+        # Only the first band is used, interleaved bands are skipped over
+        chunky = tags.get(PLANAR_CONFIGURATION, (1,))[0] == 1
+        pixel_stride = dtype.itemsize * (samples if chunky else 1)
+
+        if TILE_OFFSETS in tags:
+            block_offsets = tags[TILE_OFFSETS]
+            block_width, block_height = tags[TILE_WIDTH][0], tags[TILE_LENGTH][0]
+        else:
+            block_offsets = tags[STRIP_OFFSETS]
+            block_width, block_height = width, min(tags.get(ROWS_PER_STRIP, (height,))[0], height)
+
+        if MODEL_TRANSFORMATION in tags:
+            matrix = tags[MODEL_TRANSFORMATION]
+            if matrix[1] or matrix[4]:
+                raise ValueError(f"{path} is rotated, which is not supported")
+            pixel_width, pixel_height = matrix[0], -matrix[5]
+            origin_x, origin_y = matrix[3], matrix[7]
+        else:
+            pixel_width, pixel_height = tags[MODEL_PIXEL_SCALE][:2]
+            i, j, _, x, y, _ = tags[MODEL_TIEPOINT][:6]
+            origin_x, origin_y = x - i * pixel_width, y + j * pixel_height
+
+        # With PixelIsPoint the georeference is the center of the upper left pixel instead of its corner
+        geo_keys = tags.get(GEO_KEY_DIRECTORY, ())
+        for index in range(4, len(geo_keys) - 3, 4):
+            if geo_keys[index] == RASTER_TYPE_GEO_KEY and geo_keys[index + 3] == RASTER_PIXEL_IS_POINT:
+                origin_x -= pixel_width / 2
+                origin_y += pixel_height / 2
+
+        nodata = float(tags[GDAL_NODATA]) if GDAL_NODATA in tags else None
+        return cls(path, width, height, dtype, origin_x, origin_y, pixel_width, pixel_height, block_offsets,
+                   block_width, block_height, pixel_stride, nodata)
+
+    @classmethod
+    def from_raw(cls, path):
+        """Raw grid with an ESRI header, path is the .hdr file or the data file next to it."""
+        stem, extension = os.path.splitext(path)
+        header_path = path if extension.lower() == ".hdr" else stem + ".hdr"
+        data_path = path
+        if extension.lower() == ".hdr":
+            data_path = next((stem + raw for raw in RAW_EXTENSIONS + tuple(e.upper() for e in RAW_EXTENSIONS)
+                              if os.path.exists(stem + raw)), None)
+            if data_path is None:
+                raise ValueError(f"No raw data file next to {path}")
+
+        header = {}
+        with open(header_path, "r", encoding="utf-8") as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) >= 2:
+                    header[parts[0].lower()] = parts[1]
+
+        width, height = int(header["ncols"]), int(header["nrows"])
+        grid_float = data_path.lower().endswith(".flt")
+        bits = int(header.get("nbits", 32 if grid_float else 16))
+        pixel_type = header.get("pixeltype", "float" if grid_float or bits == 64 else "signedint").lower()
+        sample_format = {"float": 3, "signedint": 2, "unsignedint": 1}[pixel_type]
+        byte_order = ">" if header.get("byteorder", "i").lower() in ("m", "msbfirst") else "<"
+        dtype = _dtype(bits, sample_format, byte_order)
+
+        if "ulxmap" in header:
+            pixel_width = float(header.get("xdim", 1))
+            pixel_height = float(header.get("ydim", 1))
+            origin_x = float(header["ulxmap"]) - pixel_width / 2
+            origin_y = float(header["ulymap"]) + pixel_height / 2
+        else:
+            pixel_width = pixel_height = float(header["cellsize"])
+            if "xllcenter" in header:
+                origin_x = float(header["xllcenter"]) - pixel_width / 2
+                origin_y = float(header["yllcenter"]) - pixel_height / 2 + height * pixel_height
+            else:
+                origin_x = float(header["xllcorner"])
+                origin_y = float(header["yllcorner"]) + height * pixel_height
+
+        nodata = header.get("nodata", header.get("nodata_value"))
+        nodata = float(nodata) if nodata is not None else None
+        # Only the first band is used
+        bands = int(header.get("nbands", 1))
+        layout = header.get("layout", "bil").lower()
+        skip = int(header.get("skipbytes", 0))
+        pixel_stride = None
+        if bands > 1 and layout == "bil":
+            # The lines of all bands alternate, so every line of the first band is a block
+            block_offsets = skip + np.arange(height, dtype=np.int64) * width * bands * dtype.itemsize
+            block_height = 1
+        else:
+            block_offsets = [skip]
+            block_height = height
+            if bands > 1 and layout == "bip":
+                pixel_stride = dtype.itemsize * bands
+        return cls(data_path, width, height, dtype, origin_x, origin_y, pixel_width, pixel_height, block_offsets,
+                   width, block_height, pixel_stride, nodata)
+
+    def contains(self, lons, lats):
+        min_x, min_y, max_x, max_y = self.bounds
+        return (lons >= min_x) & (lons <= max_x) & (lats >= min_y) & (lats <= max_y)
+
+    def pixels(self, rows, columns):
+        """Values of the pixels at the given rows and columns, read from the memory map."""
+        blocks = (rows // self.block_height) * self.blocks_across + columns // self.block_width
+        inner = (rows % self.block_height) * self.block_width + columns % self.block_width
+        offsets = self.block_offsets[blocks] + inner * self.pixel_stride
+        raw = self._bytes[offsets[:, None] + np.arange(self.dtype.itemsize)]
+        return np.ascontiguousarray(raw).view(self.dtype).ravel().astype(np.float64)
+
+    def sample(self, lons, lats):
+        """Bilinear interpolation between the pixel centers, NaN where all four neighbours are nodata."""
+        x = (lons - self.origin_x) / self.pixel_width - 0.5
+        y = (self.origin_y - lats) / self.pixel_height - 0.5
+        column0 = np.clip(np.floor(x).astype(np.int64), 0, self.width - 1)
+        row0 = np.clip(np.floor(y).astype(np.int64), 0, self.height - 1)
+        column1 = np.minimum(column0 + 1, self.width - 1)
+        row1 = np.minimum(row0 + 1, self.height - 1)
+        # Beyond the outermost pixel centers the edge values are kept
+        tx = np.clip(x - column0, 0.0, 1.0)
+        ty = np.clip(y - row0, 0.0, 1.0)
+
+        total = np.zeros(len(lons))
+        weights = np.zeros(len(lons))
+        for rows, columns, weight in ((row0, column0, (1 - tx) * (1 - ty)), (row0, column1, tx * (1 - ty)),
+                                      (row1, column0, (1 - tx) * ty), (row1, column1, tx * ty)):
+            values = self.pixels(rows, columns)
+            valid = np.isfinite(values)
+            if self.nodata is not None:
+                valid &= values != self.nodata
+            total += np.where(valid, values * weight, 0.0)
+            weights += np.where(valid, weight, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weights > 0, total / weights, np.nan)
+
+
+def find_tiles(paths):
+    """DemTiles of the given files and of the .tif/.tiff/.hdr files in the given directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith((".tif", ".tiff", ".hdr")))
+        else:
+            files.append(path)
+    return [DemTile.from_geotiff(file) if file.lower().endswith((".tif", ".tiff")) else DemTile.from_raw(file)
+            for file in files]
+
+
+class DemElevationProvider:
+    """Elevation backend on local DEM tiles, samples any number of coordinates per call."""
+
+    batch_size = 65536
+
+    def __init__(self, paths, decimals=2):
+        self.tiles = find_tiles(paths)
+        if not self.tiles:
+            raise ValueError(f"No DEM tiles found in {', '.join(paths)}")
+        self.decimals = decimals
+        # Identifies the elevations in the cache (elevation_Cache.py)
+        self.source = "dem:" + ",".join(sorted(os.path.basename(tile.path) for tile in self.tiles))
+
+    def elevations(self, lons, lats):
+        """Elevations in meters for the coordinates, None outside of the tiles or on nodata."""
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        result = np.full(len(lons), np.nan)
+        for tile in self.tiles:
+            # Points on the border of two tiles are sampled from the first one
+            todo = np.flatnonzero(np.isnan(result) & tile.contains(lons, lats))
+            if len(todo):
+                result[todo] = tile.sample(lons[todo], lats[todo])
+        result = np.round(result, self.decimals)
+        return [None if np.isnan(value) else value for value in result.tolist()]
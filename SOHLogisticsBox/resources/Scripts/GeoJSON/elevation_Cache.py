@@ -0,0 +1,85 @@
+import sqlite3
+
+"""
+This module keeps the elevations fetched by `add_Elevation.py` in a persistent SQLite file, so every coordinate is
+queried only once, over all features and over all runs.
+
+Functionality:
+1. Coordinates are quantized to `precision` decimal places (6 by default, about 0.1 m) and used as the key,
+   together with the source of the elevations (the API URL or the DEM tiles), so different backends never mix.
+2. Every batch is deduplicated first: the end points that LineStrings share with their neighbours and with the
+   node Points are looked up once, and only the coordinates missing in the cache are sent to the backend.
+3. Every backend batch is committed as soon as it arrives. An interrupted multi-day run started again with the
+   same cache file finds all completed batches in the cache and continues where it stopped; repeated runs are
+   nearly free.
+4. Missing elevations (None, e.g. API errors) are not stored, so they are queried again in the next run.
+
+Example:
+- provider = CachedElevationProvider(ApiElevationProvider(), "elevation_cache.sqlite")
+- add_elevation(features, provider)
+"""
+
+# Coordinates per outer batch, more coordinates per batch find more duplicates before the cache is queried
+MIN_BATCH_SIZE = 10000
+
+
+class CachedElevationProvider:
+    """Elevation backend that answers from the cache file and asks the wrapped provider for the rest."""
+
+    def __init__(self, provider, path, precision=6):
+        self.provider = provider
+        self.source = getattr(provider, "source", type(provider).__name__)
+        self.scale = 10 ** precision
+        self.batch_size = max(provider.batch_size, MIN_BATCH_SIZE)
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS elevations ("
+            "source TEXT NOT NULL, lon INTEGER NOT NULL, lat INTEGER NOT NULL, elevation REAL NOT NULL, "
+            "PRIMARY KEY (source, lon, lat)) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def key(self, lon, lat):
+        return round(lon * self.scale), round(lat * self.scale)
+
+    def lookup(self, keys):
+        """Cached elevations of the keys as a dictionary, keys without elevation are left out."""
+        found = {}
+        cursor = self.connection.cursor()
+        for lon, lat in keys:
+            row = cursor.execute("SELECT elevation FROM elevations WHERE source = ? AND lon = ? AND lat = ?",
+                                 (self.source, lon, lat)).fetchone()
+            if row is not None:
+                found[(lon, lat)] = row[0]
+        return found
+
+    def elevations(self, lons, lats):
+        keys = [self.key(lon, lat) for lon, lat in zip(lons, lats)]
+        # Deduplicate, the first coordinate of every key is sent to the backend
+        unique = {}
+        for key, coordinate in zip(keys, zip(lons, lats)):
+            unique.setdefault(key, coordinate)
+        known = self.lookup(unique)
+        missing = [key for key in unique if key not in known]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        for start in range(0, len(missing), self.provider.batch_size):
+            batch = missing[start:start + self.provider.batch_size]
+            batch_lons, batch_lats = zip(*(unique[key] for key in batch))
+            fetched = self.provider.elevations(batch_lons, batch_lats)
+            rows = [(self.source, lon, lat, elevation) for (lon, lat), elevation in zip(batch, fetched)
+                    if elevation is not None]
+            # Commit every batch, so an interrupted run loses at most the batch in flight
+            self.connection.executemany("INSERT OR REPLACE INTO elevations VALUES (?, ?, ?, ?)", rows)
+            self.connection.commit()
+            known.update(zip(batch, fetched))
+
+        return [known.get(key) for key in keys]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,114 @@
+import argparse
+import os
+
+from tqdm import tqdm
+
+from add_Elevation import add_elevation, add_provider_arguments, create_provider, print_cache_statistics
+from add_MaxSpeed import assign_maxspeed, download_network, geojson_with_maxspeed_path, load_maxspeed_lookup
+from calculate_EdgeCapacity import assign_capacity_from_property
+from calculate_Incline_By_Elevation import add_incline
+from stream_GeoJSON import read_feature_collection, write_features
+
+"""
+This script builds the enriched road network in a single pass instead of running the preprocessing scripts one
+after another with an intermediate GeoJSON file (_elevation_05, _06, _07, ...) between every two of them.
+
+Every stage is a generator that takes the stream of features and yields them enriched, so all stages work on
+the same feature before the next one is read (`stream_GeoJSON.py`), and the result is written once in the
+compact format:
+
+1. elevation  - fills in missing elevations through the API or from local DEM tiles with --dem
+                (`add_Elevation.py`), in batches across features and through the elevation cache.
+2. incline    - calculates missing inclines from the elevations (`calculate_Incline_By_Elevation.py`).
+3. maxspeed   - merges maxspeed from the OSM network, downloaded first if the file does not exist
+                (`add_MaxSpeed.py`).
+4. capacity   - adds the edge capacity in FE (`calculate_EdgeCapacity.py`).
+5. compaction - writes the features without indentation or extra whitespace (like `compress_GeoJSON.py`).
+
+A new stage is a generator function `stage(features, args)` registered in STAGES. Single stages can be selected
+with --stages, e.g. to recompute only the capacity.
+
+Example:
+- python run_Network_Pipeline.py autobahn_und_bundesstrassen_germany.geojson
+      autobahn_und_bundesstrassen_deutschland_elevation_07.geojson
+- python run_Network_Pipeline.py input.geojson output.geojson --stages incline,capacity
+"""
+
+
+def elevation_stage(features, args):
+    provider = create_provider(args.dem, args.cache)
+    yield from add_elevation(features, provider)
+    print_cache_statistics(provider)
+
+
+def incline_stage(features, args):
+    for feature in features:
+        yield add_incline(feature)
+
+
+def maxspeed_stage(features, args):
+    if not os.path.exists(args.maxspeed_network):
+        download_network(args.maxspeed_network)
+    maxspeed_lookup = load_maxspeed_lookup(args.maxspeed_network)
+    for feature in features:
+        yield assign_maxspeed(feature, maxspeed_lookup)
+
+
+def capacity_stage(features, args):
+    for feature in features:
+        yield assign_capacity_from_property(feature, args.default_lanes)
+
+
+# Stages in the order they are applied
+STAGES = {
+    "elevation": elevation_stage,
+    "incline": incline_stage,
+    "maxspeed": maxspeed_stage,
+    "capacity": capacity_stage,
+}
+
+
+def run_pipeline(input_path, output_path, stage_names, args):
+    """Read the input once, stream its features through the stages and write the result once."""
+    header, features = read_feature_collection(input_path)
+
+    stream = tqdm(features, desc="Processing Features")
+    for name in stage_names:
+        stream = STAGES[name](stream, args)
+
+    count = write_features(output_path, stream, header)
+    print(f"✅ Done. {count} features processed by {', '.join(stage_names)} and saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Enrich the road network with elevation, incline, maxspeed and capacity in a single pass.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+
+    parser.add_argument("input_path", type=str, help="Path to the input GeoJSON file")
+    parser.add_argument("output_path", type=str, help="Path to the output GeoJSON file")
+    parser.add_argument(
+        "--stages",
+        type=str,
+        default=",".join(STAGES),
+        help=f"Comma separated stages to run (default: {','.join(STAGES)})"
+    )
+    parser.add_argument(
+        "--maxspeed-network",
+        type=str,
+        default=geojson_with_maxspeed_path,
+        help="OSM network with maxspeed values, downloaded if it does not exist"
+    )
+    add_provider_arguments(parser)
+    parser.add_argument("--default-lanes", type=int, default=1, help="Lanes of edges without a valid lane count")
+
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.stages.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    # Keep the pipeline order regardless of the order on the command line
+    run_pipeline(args.input_path, args.output_path, [name for name in STAGES if name in selected], args)
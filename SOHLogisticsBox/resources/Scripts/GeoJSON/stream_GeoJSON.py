@@ -0,0 +1,242 @@
+import gzip
+import json
+import os
+import re
+
+"""
+This module reads and writes GeoJSON features one at a time, so the preprocessing scripts never hold a whole
+Germany-scale FeatureCollection in memory. Peak memory is bounded by the largest single feature.
+
+Reading:
+- `read_features(path)` yields the features of a FeatureCollection or of a JSON Lines file (one feature per line).
+- `read_feature_collection(path)` additionally returns the other members of the collection (e.g. "crs"). Members
+  that follow the "features" array in the file are added to it once all features were read.
+- Both are parsed incrementally, so also a compact collection on a single line is never read at once. gzip
+  compressed files are detected from their magic bytes.
+
+Writing:
+- `FeatureWriter(path, header)` writes features one at a time in the compact format (no indentation, minimal
+  separators, non-ASCII characters preserved), as a FeatureCollection or, for .jsonl/.ndjson files, as JSON Lines.
+  Paths ending in .gz are gzip compressed.
+- The features are written to `<path>.part`, which only replaces the output once the writer was closed without an
+  exception. An interrupted run never leaves a truncated but valid looking file behind.
+- `write_features(path, features, header)` writes all features of an iterable and returns their number.
+
+Example:
+- header, features = read_feature_collection("input.geojson.gz")
+- write_features("output.geojson", (add_incline(feature) for feature in features), header)
+"""
+
+CHUNK_SIZE = 1 << 20  # characters read at a time
+JSONL_SUFFIXES = (".jsonl", ".ndjson", ".geojsonl", ".geojsonseq")
+COMPACT = {"separators": (",", ":"), "ensure_ascii": False}
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\r\n]*")
+
+
+def open_text(path, mode="r", compressed=None):
+    """
+    Open a text file, gzip compressed if it starts with the gzip magic bytes (reading) or ends with .gz, unless
+    compressed is given.
+    """
+    if compressed is None and "r" in mode:
+        with open(path, "rb") as file:
+            compressed = file.read(2) == b"\x1f\x8b"
+    elif compressed is None:
+        compressed = str(path).endswith(".gz")
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def is_jsonl_path(path):
+    path = str(path)
+    if path.endswith(".gz"):
+        path = path[:-3]
+    return path.endswith(JSONL_SUFFIXES)
+
+
+class _TextBuffer:
+    """Chunks of a text file with a read position, for decoding one JSON value after another."""
+
+    def __init__(self, file):
+        self.file = file
+        self.text = ""
+        self.position = 0
+        self.eof = False
+
+    def _read_chunk(self):
+        chunk = self.file.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what was consumed, so the buffer only holds the current value
+        self.text = self.text[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character without consuming it, None at the end of the file."""
+        while True:
+            self.position = _whitespace.match(self.text, self.position).end()
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self._read_chunk():
+                return None
+
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise ValueError(f"Invalid GeoJSON: expected one of {characters!r}, found {character!r}")
+        self.position += 1
+        return character
+
+    def decode(self):
+        """Decode the next JSON value, reading further chunks until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.position)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_chunk()
+
+
+def _top_level_features(buffer, header):
+    """
+    Yield the features of the next top-level value: all features of a FeatureCollection, whose other members are
+    stored in header, or a single feature (one line of a JSON Lines file).
+    """
+    buffer.expect("{")
+    members = {}
+    is_collection = False
+    if buffer.peek() == "}":
+        buffer.position += 1
+        return
+    while True:
+        key = buffer.decode()
+        buffer.expect(":")
+        if key == "features":
+            is_collection = True
+            header.update(members)
+            buffer.expect("[")
+            if buffer.peek() == "]":
+                buffer.position += 1
+            else:
+                while True:
+                    yield buffer.decode()
+                    if buffer.expect(",]") == "]":
+                        break
+        elif is_collection:
+            header[key] = buffer.decode()
+        else:
+            members[key] = buffer.decode()
+        if buffer.expect(",}") == "}":
+            break
+    if is_collection:
+        return
+    if members.get("type") == "FeatureCollection":
+        header.update(members)  # collection without a features member
+    else:
+        yield members
+
+
+def read_feature_collection(path):
+    """Return the members of the collection except "features" and an iterator over the features."""
+    header = {}
+    return header, _read(path, header)
+
+
+def read_features(path):
+    """Yield the features of a GeoJSON FeatureCollection or JSON Lines file one by one."""
+    return _read(path, {})
+
+
+def _read(path, header):
+    with open_text(path) as file:
+        buffer = _TextBuffer(file)
+        while buffer.peek() is not None:
+            yield from _top_level_features(buffer, header)
+
+
+class FeatureWriter:
+    """Writes features one at a time as a compact FeatureCollection, or as JSON Lines for .jsonl paths."""
+
+    def __init__(self, path, header=None, jsonl=None):
+        self.path = path
+        self.header = header if header is not None else {}
+        self.jsonl = is_jsonl_path(path) if jsonl is None else jsonl
+        self.count = 0
+        self._partial_path = f"{path}.part"
+        self._file = open_text(self._partial_path, "w", compressed=str(path).endswith(".gz"))
+        self._written_keys = set()
+        self._started = False
+
+    def _start(self):
+        """
+        Open the collection with the members known so far. This happens on the first feature, because a header
+        from read_feature_collection is only filled once the reader reached the features.
+        """
+        self._started = True
+        if self.jsonl:
+            return
+        self._file.write("{")
+        for key, value in {"type": "FeatureCollection", **self.header}.items():
+            if key != "features":
+                self._file.write(f"{json.dumps(key)}:{json.dumps(value, **COMPACT)},")
+                self._written_keys.add(key)
+        self._file.write('"features":[')
+
+    def write(self, feature):
+        if not self._started:
+            self._start()
+        elif not self.jsonl:
+            self._file.write(",")
+        self._file.write(json.dumps(feature, **COMPACT))
+        if self.jsonl:
+            self._file.write("\n")
+        self.count += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        if not self._started:
+            self._start()
+        if not self.jsonl:
+            # Members that follow the features in the input
+            self._file.write("]")
+            for key, value in self.header.items():
+                if key != "features" and key not in self._written_keys:
+                    self._file.write(f",{json.dumps(key)}:{json.dumps(value, **COMPACT)}")
+            self._file.write("}")
+        self._file.close()
+        os.replace(self._partial_path, self.path)
+
+    def abort(self):
+        """Discard the written features, an existing file at the output path is left as it was."""
+        if not self._file.closed:
+            self._file.close()
+            os.remove(self._partial_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_features(path, features, header=None):
+    """Write all features of an iterable, return their number."""
+    with FeatureWriter(path, header) as writer:
+        for feature in features:
+            writer.write(feature)
+    return writer.count
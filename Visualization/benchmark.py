@@ -0,0 +1,146 @@
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+
+from loadgen import LoadServer, Scenario
+from main import Visualization
+
+"""
+Benchmark of the visualization client against the synthetic load generator.
+
+Every scenario starts a LoadServer on a free local port and runs the real client (main.Visualization) against it
+without a display: the receiver and decoder threads as usual and the render loop on the calling thread, without
+an FPS limit. Once the first tick was drawn (after the initial vector and raster layers were loaded) and a short
+warm-up, the client is measured for a fixed time:
+
+    fps          rendered frames per second
+    decode ms    median time to decode a received message
+    apply ms     median time to apply the queued frames to the scene
+    render ms    median and 95th percentile of raster, vector, density and entity drawing per frame
+    frame ms     median time of a whole frame including the blit
+    coalesced    frames replaced by a newer one before they were drawn
+
+    python3 benchmark.py                            # all scenarios
+    python3 benchmark.py agents-50k vectors --duration 10 --output benchmarks.jsonl
+
+With --output every result is appended as one JSON line together with the date and the git revision, so results
+of different revisions can be compared over time.
+"""
+
+SCENARIOS = {
+    "agents-1k": Scenario(entities=1000, types=1, rate=60),
+    "agents-50k": Scenario(entities=25000, types=2, rate=60),
+    "agents-200k": Scenario(entities=50000, types=4, rate=60),
+    "vectors": Scenario(entities=1000, vector_layers=50, vertices=2000, rate=60),
+    "raster": Scenario(entities=1000, raster=500, rate=60),
+    "mixed": Scenario(entities=25000, types=2, vector_layers=20, vertices=2000, raster=250, rate=30),
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _median(values):
+    return round(float(np.median(values)), 3) if values else None
+
+
+def _percentile(values, percentile):
+    return round(float(np.percentile(values, percentile)), 3) if values else None
+
+
+def run_scenario(name, scenario, duration=5.0, warmup=1.0, binary_frames=True, load_timeout=120.0):
+    """ Runs the client against a scenario, returns the measured results as a dictionary. """
+    server = LoadServer(scenario, port=0).start()
+    vis = Visualization([server.uri])
+    vis.binary_frames = binary_frames
+    vis.desired_fps = 0  # no FPS limit
+    threading.Thread(target=vis.receive_loop, args=(vis.feeds[0],), daemon=True).start()
+    threading.Thread(target=vis.decode_loop, daemon=True).start()
+
+    frame_rows = []
+    try:
+        started = time.perf_counter()
+        while vis.scene.snapshot.tick == 0 and time.perf_counter() - started < load_timeout:
+            vis.visualize_content()
+        load_seconds = time.perf_counter() - started
+        measuring_from = time.perf_counter() + warmup
+        while time.perf_counter() < measuring_from:
+            vis.visualize_content()
+        for samples in vis.timings.samples.values():
+            samples.clear()
+        coalesced_from = vis.coalesced_frames
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            vis.visualize_content()
+            frame_rows.append(dict(vis.timings.last_frame))
+        elapsed = time.perf_counter() - start
+    finally:
+        vis.run = False
+        server.close()
+        vis.timings.close()
+
+    decode = list(vis.timings.samples["decode"])
+    apply = [row["apply"] for row in frame_rows if row["apply"] > 0]
+    render = [row["raster"] + row["vector"] + row["density"] + row["entity"] for row in frame_rows]
+    frame = [row["raster"] + row["vector"] + row["density"] + row["entity"] + row["blit"] for row in frame_rows]
+    return {
+        "scenario": name,
+        "parameters": scenario._asdict(),
+        "frameFormat": "binary" if binary_frames else "json",
+        "loadSeconds": round(load_seconds, 3),
+        "fps": round(len(frame_rows) / elapsed, 2),
+        "decodeMs": _median(decode),
+        "applyMs": _median(apply),
+        "renderMs": _median(render),
+        "renderP95Ms": _percentile(render, 95),
+        "frameMs": _median(frame),
+        "coalesced": vis.coalesced_frames - coalesced_from,
+        "ticks": vis.scene.snapshot.tick,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the visualization client with synthetic load.")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--duration", type=float, default=5.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds before measuring")
+    parser.add_argument("--json-frames", action="store_true", help="Ask for JSON instead of binary frames")
+    parser.add_argument("--output", help="Append the results as JSON lines to this file")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    revision = git_revision()
+    print(f"{'scenario':<14}{'load s':>8}{'fps':>9}{'decode ms':>11}{'apply ms':>10}{'render ms':>11}{'p95':>9}"
+          f"{'frame ms':>10}{'coalesced':>11}")
+    for name in args.scenarios or SCENARIOS:
+        result = run_scenario(name, SCENARIOS[name], args.duration, args.warmup, not args.json_frames)
+        print(f"{name:<14}{result['loadSeconds']:>8}{result['fps']:>9}{result['decodeMs'] or 0:>11}"
+              f"{result['applyMs'] or 0:>10}{result['renderMs'] or 0:>11}{result['renderP95Ms'] or 0:>9}"
+              f"{result['frameMs'] or 0:>10}{result['coalesced']:>11}")
+        if args.output:
+            result.update(date=datetime.datetime.now().isoformat(timespec="seconds"), revision=revision,
+                          python=sys.version.split()[0])
+            with open(args.output, "a", encoding="utf-8") as file:
+                file.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import numpy as np
+
+from raster_layer import RasterImage
+
+"""
+Decaying density ("heat") grid of the entity positions.
+
+Every published frame multiplies the grid by a decay factor and adds the number of entities in each cell, counted
+with a single np.bincount over the flattened cell indices of all positions. Older positions fade out with the
+given half-life (in published frames), so the grid shows where agents pile up over the recent past instead of
+only the current positions.
+
+The grid covers the world with a fixed number of cells, so apart from the binning step its cost does not depend
+on the number of entities: it is colormapped into an RGBA image of one pixel per cell (logarithmic scale,
+transparent where empty) and drawn like a raster layer.
+"""
+
+# colormap stops: position in 0..1 and RGBA color
+HEAT_STOPS = ((0.0, (0, 0, 80, 0)), (0.25, (0, 60, 255, 110)), (0.5, (0, 220, 220, 150)),
+              (0.75, (255, 230, 0, 190)), (1.0, (255, 40, 0, 230)))
+
+
+def colormap(stops=HEAT_STOPS, size=256):
+    """ size x 4 uint8 lookup table interpolated between the stops. """
+    positions = np.linspace(0, 1, size)
+    stop_positions = [position for position, _ in stops]
+    table = np.empty((size, 4), dtype=np.uint8)
+    for channel in range(4):
+        table[:, channel] = np.interp(positions, stop_positions, [color[channel] for _, color in stops])
+    return table
+
+
+class DensityLayer:
+    def __init__(self, bins=200, half_life=30, enabled=False):
+        self.bins = bins
+        self.half_life = half_life
+        self.enabled = enabled
+        self.decay = 0.5 ** (1 / half_life)
+        self.table = colormap()
+        self.grid = None
+        self._world_size = None
+
+    def reset(self):
+        self.grid = None
+
+    def update(self, world_size, layers):
+        """ Decays the grid and adds the positions of the entity layers, returns the colormapped RasterImage. """
+        world_size = tuple(world_size)
+        if self.grid is None or self._world_size != world_size:
+            self.grid = np.zeros((self.bins, self.bins), dtype=np.float64)
+            self._world_size = world_size
+        min_x, min_y, max_x, max_y = world_size
+        scale_x = self.bins / (max_x - min_x)
+        scale_y = self.bins / (max_y - min_y)
+
+        self.grid *= self.decay
+        for layer in layers:
+            if len(layer) == 0:
+                continue
+            xs, ys = layer.array["x"], layer.array["y"]
+            inside = (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+            columns = np.minimum(((xs[inside] - min_x) * scale_x).astype(np.intp), self.bins - 1)
+            rows = np.minimum(((ys[inside] - min_y) * scale_y).astype(np.intp), self.bins - 1)
+            counts = np.bincount(rows * self.bins + columns, minlength=self.bins * self.bins)
+            self.grid += counts.reshape(self.bins, self.bins)
+        return self.image()
+
+    def image(self):
+        peak = self.grid.max() if self.grid is not None else 0
+        if peak <= 0:
+            return None
+        levels = np.log1p(self.grid) * ((len(self.table) - 1) / np.log1p(peak))
+        pixels = self.table[levels.astype(np.intp)]
+        pixels[self.grid < 0.05, 3] = 0
+        min_x, min_y, max_x, max_y = self._world_size
+        cell_width = (max_x - min_x) / self.bins
+        cell_height = (max_y - min_y) / self.bins
+        return RasterImage.from_pixels(pixels, min_x + cell_width / 2, min_y + cell_height / 2, cell_width,
+                                       cell_height)
@@ -0,0 +1,223 @@
+from types import MappingProxyType
+
+import numpy as np
+
+"""
+Per type storage of the entities received from the simulation.
+
+Positions are kept in numpy structured arrays, so the world-to-screen transform of a whole type is a single
+vectorized expression. Projected positions are cached until the entities of the type or the projection change.
+
+Layers are not modified once they are stored, updates build new layers. A snapshot of the store is therefore a
+shallow copy of its layer mapping, which the render thread can read while the receiver goes on applying updates.
+
+Besides full entity lists (keyframes) a type can be updated with deltas keyed by agent id. A delta only applies
+on top of the state with the previous sequence number; if it does not, the store reports it and the client asks
+the simulation for a new keyframe.
+"""
+
+ENTITY_DTYPE = np.dtype([("id", "<i8"), ("x", "<f8"), ("y", "<f8")])
+
+
+def _empty_column(like, count):
+    if like.dtype == object:
+        return np.full(count, None, dtype=object)
+    return np.full(count, np.nan, dtype=like.dtype)
+
+
+def _attributes_from_dicts(entities):
+    attributes = {}
+    for index, entity in enumerate(entities):
+        if "p" not in entity:
+            continue
+        for key, value in entity["p"].items():
+            if key not in attributes:
+                attributes[key] = np.full(len(entities), None, dtype=object)
+            attributes[key][index] = value
+    return attributes
+
+
+class EntityLayer:
+    """ Entities of one type key: a structured array and optional per entity attribute columns, never modified. """
+
+    def __init__(self, array, attributes, sequence=None):
+        self.array = array
+        self.attributes = attributes
+        self.sequence = sequence
+
+    def __len__(self):
+        return len(self.array)
+
+    @classmethod
+    def from_dicts(cls, entities, sequence=None):
+        """ Builds a layer from the JSON entity list, attributes are taken from the 'p' dictionaries. """
+        count = len(entities)
+        array = np.empty(count, dtype=ENTITY_DTYPE)
+        array["x"] = np.fromiter((entity["x"] for entity in entities), dtype=np.float64, count=count)
+        array["y"] = np.fromiter((entity["y"] for entity in entities), dtype=np.float64, count=count)
+        array["id"] = np.fromiter((entity.get("id", index) for index, entity in enumerate(entities)),
+                                  dtype=np.int64, count=count)
+        return cls(array, _attributes_from_dicts(entities), sequence)
+
+    @classmethod
+    def from_columns(cls, columns):
+        """ Builds a layer from the columns of a binary frame. """
+        count = len(columns.x)
+        array = np.empty(count, dtype=ENTITY_DTYPE)
+        array["id"] = columns.ids if columns.ids is not None else np.arange(count)
+        array["x"] = columns.x
+        array["y"] = columns.y
+        return cls(array, dict(columns.properties), columns.sequence)
+
+    def without(self, removed):
+        """ Copy of the layer without the given ids. """
+        keep = ~np.isin(self.array["id"], removed)
+        return EntityLayer(self.array[keep], {name: values[keep] for name, values in self.attributes.items()},
+                           self.sequence)
+
+    def with_sequence(self, sequence):
+        return EntityLayer(self.array, self.attributes, sequence)
+
+    def upserted(self, ids, xs, ys, attributes=None):
+        """ Copy of the layer with known ids moved and unknown ids inserted. """
+        attributes = attributes or {}
+        array = self.array.copy()
+        columns = {name: values.copy() for name, values in self.attributes.items()}
+        for name, values in attributes.items():
+            if name not in columns:
+                columns[name] = _empty_column(values, len(array))
+
+        ids = np.asarray(ids, dtype=np.int64)
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        order = np.argsort(array["id"], kind="stable")
+        sorted_ids = array["id"][order]
+        positions = np.searchsorted(sorted_ids, ids)
+        found = positions < len(sorted_ids)
+        found[found] = sorted_ids[positions[found]] == ids[found]
+
+        rows = order[positions[found]]
+        array["x"][rows] = xs[found]
+        array["y"][rows] = ys[found]
+        for name, values in attributes.items():
+            columns[name][rows] = values[found]
+
+        inserted = ~found
+        if inserted.any():
+            added = np.empty(int(inserted.sum()), dtype=ENTITY_DTYPE)
+            added["id"] = ids[inserted]
+            added["x"] = xs[inserted]
+            added["y"] = ys[inserted]
+            array = np.concatenate([array, added])
+            for name, values in columns.items():
+                new_values = attributes[name][inserted] if name in attributes else _empty_column(values, len(added))
+                columns[name] = np.concatenate([values, new_values])
+
+        return EntityLayer(array, columns, self.sequence)
+
+
+class EntityStore:
+    def __init__(self):
+        self._layers = {}
+
+    def __len__(self):
+        return len(self._layers)
+
+    def keys(self):
+        return self._layers.keys()
+
+    def items(self):
+        return self._layers.items()
+
+    def set_layer(self, type_key, layer):
+        self._layers[type_key] = layer
+
+    def set_dicts(self, type_key, entities, sequence=None):
+        self.set_layer(type_key, EntityLayer.from_dicts(entities, sequence))
+
+    def set_columns(self, type_key, columns):
+        """ Applies a binary keyframe or delta block, returns False if a delta was out of sequence. """
+        if not columns.delta:
+            self.set_layer(type_key, EntityLayer.from_columns(columns))
+            return True
+        layer = self._in_sequence(type_key, columns.sequence)
+        if layer is None:
+            return False
+        if columns.removed is not None and len(columns.removed):
+            layer = layer.without(columns.removed)
+        layer = layer.upserted(columns.ids, columns.x, columns.y, columns.properties)
+        self.set_layer(type_key, layer.with_sequence(columns.sequence))
+        return True
+
+    def apply_json_delta(self, type_key, delta, sequence=None):
+        """ Applies the insert, move and remove records of a JSON delta, returns False if out of sequence. """
+        layer = self._in_sequence(type_key, sequence)
+        if layer is None:
+            return False
+        if delta.get("remove"):
+            layer = layer.without(np.asarray(delta["remove"], dtype=np.int64))
+        inserts = delta.get("insert")
+        if inserts:
+            inserted = EntityLayer.from_dicts(inserts)
+            layer = layer.upserted(inserted.array["id"], inserted.array["x"], inserted.array["y"],
+                                   inserted.attributes)
+        moves = delta.get("move")
+        if moves:
+            # ids in a column of their own, float64 can not hold ids above 2**53 exactly
+            ids = np.fromiter((move[0] for move in moves), dtype=np.int64, count=len(moves))
+            positions = np.asarray([move[1:] for move in moves], dtype=np.float64).reshape(-1, 2)
+            layer = layer.upserted(ids, positions[:, 0], positions[:, 1])
+        if sequence is not None:
+            layer = layer.with_sequence(sequence)
+        self.set_layer(type_key, layer)
+        return True
+
+    def _in_sequence(self, type_key, sequence):
+        layer = self._layers.get(type_key)
+        if layer is None:
+            return None
+        if sequence is not None and layer.sequence is not None and sequence != layer.sequence + 1:
+            return None
+        return layer
+
+    def clear(self, predicate=None):
+        """ Removes all layers, or those whose key matches the predicate. """
+        if predicate is None:
+            self._layers.clear()
+            return
+        for key in [key for key in self._layers if predicate(key)]:
+            del self._layers[key]
+
+    def snapshot(self):
+        """ Read-only view of the current layers that later updates do not change. """
+        return MappingProxyType(dict(self._layers))
+
+
+class ScreenPositions:
+    """ Projected positions of entity layers, cached until the layer of a type or the projection changes. """
+
+    def __init__(self):
+        self._projected = {}
+
+    def projected(self, type_key, layer, projection):
+        """ Screen positions of all entities of a layer as two float arrays. """
+        cached = self._projected.get(type_key)
+        if cached is not None and cached[0] is layer and cached[1] == projection.key:
+            return cached[2], cached[3]
+
+        xs, ys = projection.project(layer.array["x"], layer.array["y"])
+        self._projected[type_key] = (layer, projection.key, xs, ys)
+        return xs, ys
+
+    def visible(self, type_key, layer, projection, margin_pixel=0):
+        """ Indices and screen positions of the entities of a layer that lie inside the window. """
+        xs, ys = self.projected(type_key, layer, projection)
+        width, height = projection.window_size
+        indices = np.flatnonzero((xs >= -margin_pixel) & (xs < width + margin_pixel) &
+                                 (ys >= -margin_pixel) & (ys < height + margin_pixel))
+        return indices, xs[indices], ys[indices]
+
+    def retain(self, type_keys):
+        """ Forgets the positions of the types that are no longer shown. """
+        for type_key in [type_key for type_key in self._projected if type_key not in type_keys]:
+            del self._projected[type_key]
@@ -0,0 +1,177 @@
+import random
+import threading
+import time
+
+from websocket import create_connection, WebSocketException
+
+import protocol
+
+"""
+Connections to one or more simulation processes and the merge of their streams into one view.
+
+Large scenarios can be split across several simulation processes, e.g. one per region. Every process is a Feed
+with its own websocket and receiver thread. Decoded frames are tagged with the index of their feed ("feed"), so
+the scene keeps the entities, vector and raster layers of the feeds apart even if they use the same type keys.
+
+The TickMerger aligns the feeds by tick before frames reach the render pipeline. Frames of a feed that is ahead
+are held back until the other feeds caught up, but never by more than lag_window ticks: a feed that lags further
+behind (or stopped sending) no longer holds back the others, its frames are passed on as they arrive. Frames are
+released in tick order, so the view does not show one region several ticks ahead of another.
+
+A lost connection is re-established on the receiver thread of its feed, with exponentially growing delays between
+the attempts (with full jitter, so several viewers do not reconnect in lockstep). The delays only start over once
+a frame was received, so a server that accepts connections and drops them right away is not retried in a tight
+loop. The state received so far stays visible meanwhile; after reconnecting, the feed asks the simulation for a
+keyframe to resync its entities.
+"""
+
+CONNECT_TIMEOUT = 5
+
+
+class Feed:
+    """ Websocket connection to one simulation process. """
+
+    def __init__(self, index, uri, on_connect=None, on_disconnect=None, initial_delay=0.5, max_delay=30.0):
+        self.index = index
+        self.uri = uri
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.ws = None
+        self.awaiting_keyframe = False
+        self.connections = 0
+        self.attempts = 0
+        self.next_attempt = 0.0
+        self._received = False
+
+    @property
+    def reconnecting(self):
+        return self.ws is None and self.attempts > 0
+
+    def retry_in(self):
+        return max(0.0, self.next_attempt - time.monotonic())
+
+    def connect(self):
+        """ The open websocket, or None if connecting failed or the next attempt is not due yet. """
+        if self.ws is not None or time.monotonic() < self.next_attempt:
+            return self.ws
+        try:
+            ws = create_connection(self.uri, timeout=CONNECT_TIMEOUT)
+            ws.settimeout(None)
+            print(f"Connecting to simulation at {self.uri} ...")
+            if self.on_connect is not None:
+                for message in self.on_connect(self):
+                    ws.send(message)
+        except (OSError, WebSocketException):
+            self._schedule_retry()
+            if self.attempts == 1:
+                print(f"Waiting for running simulation at {self.uri} ... ")
+            return None
+
+        self.ws = ws
+        self.connections += 1
+        self._received = False
+        return ws
+
+    def _schedule_retry(self):
+        delay = min(self.max_delay, self.initial_delay * 2 ** min(self.attempts, 16))
+        self.attempts += 1
+        self.next_attempt = time.monotonic() + random.uniform(0, delay)
+
+    def received(self):
+        """ Called for every received frame, the first one of a connection resets the reconnect delays. """
+        if not self._received:
+            self._received = True
+            self.attempts = 0
+
+    def disconnect(self, ws):
+        ws.shutdown()
+        if self.ws is ws:
+            self.ws = None
+            self.awaiting_keyframe = False
+            if self._received:
+                self.next_attempt = 0.0
+            else:
+                self._schedule_retry()
+        if self.on_disconnect is not None:
+            self.on_disconnect(self)
+
+    def send(self, message):
+        ws = self.ws
+        if ws is None:
+            return
+        try:
+            ws.send(message)
+        except (OSError, WebSocketException):
+            self.disconnect(ws)
+
+    def request_keyframe(self):
+        if not self.awaiting_keyframe:
+            self.awaiting_keyframe = True
+            self.send(protocol.keyframe_request_message())
+
+
+class TickMerger:
+    """ Holds frames of feeds that are ahead, passes frames on to frames.put in tick order. """
+
+    def __init__(self, frames, lag_window=10):
+        self.frames = frames
+        self.lag_window = lag_window
+        self.held_frames = 0
+        self._lock = threading.Lock()
+        self._ticks = {}
+        self._pending = []
+        self._sequence = 0
+
+    def put(self, data):
+        feed = data.get("feed", 0)
+        with self._lock:
+            if "reset" in data:
+                self._reset(data.get("feed"))
+                self.frames.put(data)
+                self._release()
+                return
+            tick = data.get("currentTick", self._ticks.get(feed))
+            if tick is not None:
+                self._ticks[feed] = tick
+            self._pending.append((tick if tick is not None else -1, self._sequence, data))
+            self._sequence += 1
+            self._release()
+
+    def forget(self, feed):
+        """ Drops the held frames and the tick of a feed, e.g. after its connection was lost. """
+        with self._lock:
+            self._reset(feed)
+            self._release()
+
+    def _reset(self, feed):
+        """ Forgets the frames and tick of a feed, or of all feeds if feed is None. """
+        if feed is None:
+            self._pending.clear()
+            self._ticks.clear()
+            return
+        self._pending = [entry for entry in self._pending if entry[2].get("feed", 0) != feed]
+        self._ticks.pop(feed, None)
+
+    def watermark(self):
+        """ Latest tick that all feeds within the lag window have reached. """
+        if not self._ticks:
+            return None
+        latest = max(self._ticks.values())
+        return max(min(self._ticks.values()), latest - self.lag_window)
+
+    def _release(self):
+        watermark = self.watermark()
+        if watermark is None:
+            released, self._pending = self._pending, []
+        else:
+            released = [entry for entry in self._pending if entry[0] <= watermark]
+            if len(released) == len(self._pending):
+                self._pending = []
+            else:
+                self._pending = [entry for entry in self._pending if entry[0] > watermark]
+        released.sort(key=lambda entry: (entry[0], entry[1]))
+        for _, _, data in released:
+            self.frames.put(data)
+        self.held_frames = len(self._pending)
@@ -0,0 +1,104 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+"""
+High-resolution timers for the stages of the visualization pipeline.
+
+Every measurement is kept in a rolling window per stage, from which the HUD overlay shows percentiles. The stages
+run on different threads (receive and decode on the receiver, apply on the decoder, the drawing stages and the
+blit on the render thread), so the time spent in each stage since the previous rendered frame is summed up and
+written as one row per rendered frame when an export file is given:
+
+    frame.csv     frame,time,receive,decode,apply,raster,vector,density,entity,blit (milliseconds)
+    frame.jsonl   {"frame": 1, "time": 0.016, "receive": 0.4, ...}
+
+Receive is the time spent in the websocket read, including the wait for the next message.
+"""
+
+STAGES = ("receive", "decode", "apply", "raster", "vector", "density", "entity", "blit")
+PERCENTILES = (50, 95, 99)
+
+
+class _Measurement:
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.timings.add(self.stage, (time.perf_counter_ns() - self.start) / 1e6)
+
+
+class FrameTimings:
+    def __init__(self, window=300, export_path=None):
+        self.window = window
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES}
+        self.frames = 0
+        self.last_frame = dict.fromkeys(STAGES, 0.0)
+        self._lock = threading.Lock()
+        self._pending = dict.fromkeys(STAGES, 0.0)
+        self._started = time.perf_counter()
+        self._export = None
+        self._writer = None
+        if export_path is not None:
+            self._export = open(export_path, "w", newline="", encoding="utf-8")
+            if export_path.endswith(".csv"):
+                self._writer = csv.writer(self._export)
+                self._writer.writerow(("frame", "time") + STAGES)
+
+    def measure(self, stage):
+        """ Context manager that adds the time spent in its block to a stage. """
+        return _Measurement(self, stage)
+
+    def add(self, stage, milliseconds):
+        with self._lock:
+            self.samples[stage].append(milliseconds)
+            self._pending[stage] += milliseconds
+
+    def end_frame(self):
+        """ Completes a rendered frame and writes the stage times since the previous one to the export file. """
+        with self._lock:
+            self.frames += 1
+            pending = self._pending
+            self._pending = dict.fromkeys(STAGES, 0.0)
+        self.last_frame = pending
+        if self._export is None:
+            return
+        elapsed = round(time.perf_counter() - self._started, 6)
+        if self._writer is not None:
+            self._writer.writerow([self.frames, elapsed] + [round(pending[stage], 4) for stage in STAGES])
+        else:
+            row = {"frame": self.frames, "time": elapsed}
+            row.update((stage, round(pending[stage], 4)) for stage in STAGES)
+            self._export.write(json.dumps(row) + "\n")
+
+    def percentiles(self, stage, percentiles=PERCENTILES):
+        """ Percentiles of the recent measurements of a stage in milliseconds, None before the first one. """
+        with self._lock:
+            samples = np.fromiter(self.samples[stage], dtype=np.float64)
+        if len(samples) == 0:
+            return None
+        return np.percentile(samples, percentiles).tolist()
+
+    def summary_rows(self):
+        """ Header and one row of formatted percentiles per measured stage, for the HUD overlay. """
+        rows = [("stage",) + tuple(f"p{percentile} ms" for percentile in PERCENTILES)]
+        for stage in STAGES:
+            values = self.percentiles(stage)
+            if values is not None:
+                rows.append((stage,) + tuple(f"{value:.2f}" for value in values))
+        return rows
+
+    def close(self):
+        if self._export is not None:
+            self._export.close()
+            self._export = None
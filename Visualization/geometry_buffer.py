@@ -0,0 +1,129 @@
+import numpy as np
+
+from simplify import simplify_mask
+
+"""
+Columnar storage of vector geometries.
+
+The nested GeoJSON coordinate lists of all geometries of one type are converted once, when a layer arrives, into
+a contiguous (vertices x 2) float64 array and three offset arrays, like in Arrow or GeoArrow:
+
+    coordinates       x, y of every vertex, ring after ring
+    ring_offsets      first vertex of every ring, plus the total vertex count
+    part_offsets      first ring of every part (polygon of a MultiPolygon), plus the total ring count
+    geometry_offsets  first part of every geometry, plus the total part count
+
+Every geometry type maps onto these three levels: a Point or MultiPoint is one part with one ring of its points,
+a LineString or LineRing one part with one ring, a Polygon one part with its rings. Projecting to the screen is
+a single affine transform over the whole coordinate array, cached until the projection changes, and drawing only
+slices the rings of the visible geometries out of it.
+"""
+
+CLOSED_TYPES = ("LineRing", "Polygon", "MultiPolygon")
+
+
+def _parts(geometry_type, coordinates):
+    """ The coordinates of a geometry as a list of parts, each a list of rings. """
+    if geometry_type == "Point":
+        return [[[coordinates]]]
+    if geometry_type in ("MultiPoint", "LineString", "LineRing"):
+        return [[coordinates]]
+    if geometry_type == "Polygon":
+        return [coordinates]
+    if geometry_type == "MultiPolygon":
+        return coordinates
+    raise ValueError("unsupported geometry type %s" % geometry_type)
+
+
+def _vertices(ring):
+    """ (n x 2) float64 array of a list of positions, further ordinates like the elevation are dropped. """
+    vertices = np.asarray(ring, dtype=np.float64)
+    if vertices.size == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    return vertices[:, :2]
+
+
+class GeometryBuffer:
+    def __init__(self, geometry_type, coordinates, ring_offsets, part_offsets, geometry_offsets):
+        self.geometry_type = geometry_type
+        self.coordinates = coordinates
+        self.ring_offsets = ring_offsets
+        self.part_offsets = part_offsets
+        self.geometry_offsets = geometry_offsets
+        self._projected = None
+        self._projected_key = None
+
+    def __len__(self):
+        return len(self.geometry_offsets) - 1
+
+    @classmethod
+    def from_geometries(cls, geometry_type, geometries):
+        """ Buffer of GeoJSON geometry dictionaries of one type, geometries without vertices are skipped. """
+        rings, ring_counts, part_counts = [], [], []
+        for geometry in geometries:
+            parts = [[_vertices(ring) for ring in part] for part in _parts(geometry_type, geometry["coordinates"])]
+            if not any(len(ring) for part in parts for ring in part):
+                continue
+            for part in parts:
+                rings.extend(part)
+                ring_counts.append(len(part))
+            part_counts.append(len(parts))
+        return cls._from_counts(geometry_type, rings, ring_counts, part_counts)
+
+    @classmethod
+    def _from_counts(cls, geometry_type, rings, ring_counts, part_counts):
+        coordinates = np.concatenate(rings) if rings else np.empty((0, 2), dtype=np.float64)
+        ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+        np.cumsum([len(ring) for ring in rings], out=ring_offsets[1:])
+        part_offsets = np.zeros(len(ring_counts) + 1, dtype=np.int64)
+        np.cumsum(ring_counts, out=part_offsets[1:])
+        geometry_offsets = np.zeros(len(part_counts) + 1, dtype=np.int64)
+        np.cumsum(part_counts, out=geometry_offsets[1:])
+        return cls(geometry_type, np.ascontiguousarray(coordinates), ring_offsets, part_offsets, geometry_offsets)
+
+    def bounds(self):
+        """ (geometries x 4) array of the bounding boxes min x, min y, max x, max y. """
+        if len(self) == 0:
+            return np.empty((0, 4), dtype=np.float64)
+        first_vertices = self.ring_offsets[self.part_offsets[self.geometry_offsets[:-1]]]
+        minimum = np.minimum.reduceat(self.coordinates, first_vertices)
+        maximum = np.maximum.reduceat(self.coordinates, first_vertices)
+        return np.hstack([minimum, maximum])
+
+    def simplified(self, tolerance):
+        """ Copy with every ring simplified, closed rings keep at least four points. """
+        keep = simplify_mask(self.coordinates, self.ring_offsets, tolerance, self.geometry_type in CLOSED_TYPES)
+        ring_offsets = np.concatenate([[0], np.cumsum(keep)])[self.ring_offsets]
+        return GeometryBuffer(self.geometry_type, self.coordinates[keep], ring_offsets, self.part_offsets,
+                              self.geometry_offsets)
+
+    def projected(self, projection):
+        """ Screen coordinates of all vertices, one affine transform per projection. """
+        if self._projected_key != projection.key:
+            self._projected = self.coordinates * (projection.scale_x, projection.scale_y) + \
+                (projection.offset_x, projection.offset_y)
+            self._projected_key = projection.key
+        return self._projected
+
+    def screen_rings(self, projection, geometries):
+        """ Screen point lists of the rings of the given geometry positions, in order. """
+        projected = self.projected(projection)
+        ring_offsets = self.ring_offsets
+        first_rings = self.part_offsets[self.geometry_offsets[geometries]]
+        last_rings = self.part_offsets[self.geometry_offsets[np.asarray(geometries) + 1]]
+        for first_ring, last_ring in zip(first_rings.tolist(), last_rings.tolist()):
+            for ring in range(first_ring, last_ring):
+                vertices = projected[ring_offsets[ring]:ring_offsets[ring + 1]]
+                # pairs of two flat lists instead of ndarray.tolist(), whose many small lists keep the GC busy
+                yield list(zip(vertices[:, 0].tolist(), vertices[:, 1].tolist()))
+
+    def screen_vertices(self, projection, geometries):
+        """ Screen x and y arrays of all vertices of the given geometry positions. """
+        projected = self.projected(projection)
+        first_vertices = self.ring_offsets[self.part_offsets[self.geometry_offsets[geometries]]]
+        last_vertices = self.ring_offsets[self.part_offsets[self.geometry_offsets[np.asarray(geometries) + 1]]]
+        if len(first_vertices) == 0:
+            return projected[:0, 0], projected[:0, 1]
+        counts = last_vertices - first_vertices
+        vertices = np.repeat(first_vertices - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return projected[vertices, 0], projected[vertices, 1]
@@ -0,0 +1,70 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+"""
+Cached text rendering for entity labels and the HUD.
+
+Rendering text with pygame is expensive compared to blitting the resulting surface, so rendered surfaces are kept
+in a bounded LRU cache keyed by text and color. LabelPlacer limits how many labels are drawn per frame by allowing
+at most one label per occupied area of the window.
+"""
+
+
+class GlyphCache:
+    def __init__(self, font, max_size=4096):
+        self.font = font
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    def render(self, text, color):
+        key = (text, tuple(color))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.font.render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_size:
+            self._surfaces.popitem(last=False)
+        return surface
+
+
+class LabelPlacer:
+    """ Skips labels that would overlap labels already placed in the current frame. """
+
+    def __init__(self, window_size, cell_size):
+        self.cell_size = cell_size
+        self.columns = math.ceil(window_size[0] / cell_size) + 1
+        self.rows = math.ceil(window_size[1] / cell_size) + 1
+        self._occupied = np.zeros((self.columns, self.rows), dtype=bool)
+
+    def candidates(self, xs, ys):
+        """ Indices of at most one position per free cell, the cheap vectorized pre-filter. """
+        columns = np.clip((xs // self.cell_size).astype(np.int64), 0, self.columns - 1)
+        rows = np.clip((ys // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        free = ~self._occupied[columns, rows]
+        indices = np.flatnonzero(free)
+        _, first = np.unique(columns[indices] * self.rows + rows[indices], return_index=True)
+        return np.sort(indices[first])
+
+    def place(self, x, y, width, height):
+        """ Reserves the cells covered by a label, returns False if any of them is taken. """
+        first_column = max(0, int(x // self.cell_size))
+        last_column = min(self.columns - 1, int((x + width) // self.cell_size))
+        first_row = max(0, int(y // self.cell_size))
+        last_row = min(self.rows - 1, int((y + height) // self.cell_size))
+        cells = self._occupied[first_column:last_column + 1, first_row:last_row + 1]
+        if cells.any():
+            return False
+        cells[...] = True
+        return True
@@ -0,0 +1,307 @@
+import argparse
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import protocol
+
+"""
+Synthetic stand-in for a MARS simulation that serves the visualization websocket.
+
+The server emits generated frames in the same formats as a simulation: world size, vector layers and raster
+layers when a client connects, then entity positions of every type once per tick, as binary frames or JSON
+depending on the negotiation message of the client. Agents move on a random walk. The amount of data is set by a
+Scenario: entities per type, number of types, vector layers and vertices per layer, raster size and tick rate.
+
+Control messages of the client are honoured like a simulation does: timeToWaitInMilliseconds slows the tick rate
+down, frameInterval sends only every Nth tick and requestKeyframe is answered with the next tick anyway, since
+every entity frame is a keyframe.
+
+    python3 loadgen.py --entities 50000 --types 2 --vector-layers 4 --vertices 2000 --raster 200 --rate 30
+
+The websocket server is a minimal RFC 6455 implementation on the standard library, good enough for one or a few
+local clients.
+"""
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+Scenario = namedtuple("Scenario", ["entities", "types", "vector_layers", "vertices", "raster", "rate", "ticks"],
+                      defaults=[1000, 1, 0, 0, 0, 30.0, 0])
+
+WORLD_SIZE = (0.0, 0.0, 1000.0, 1000.0)
+
+
+class SyntheticSimulation:
+    """ Generates the messages of a scenario, ticks=0 runs forever. """
+
+    def __init__(self, scenario, seed=1):
+        self.scenario = scenario
+        self.random = np.random.default_rng(seed)
+        width, height = WORLD_SIZE[2] - WORLD_SIZE[0], WORLD_SIZE[3] - WORLD_SIZE[1]
+        self.positions = [(self.random.random(scenario.entities) * width,
+                           self.random.random(scenario.entities) * height) for _ in range(scenario.types)]
+        self.tick = 0
+
+    def world_message(self):
+        min_x, min_y, max_x, max_y = WORLD_SIZE
+        return json.dumps({"worldSize": {"minX": min_x, "minY": min_y, "maxX": max_x, "maxY": max_y}})
+
+    def vector_message(self):
+        """ Vector layers of random walk line strings, None if the scenario has none. """
+        if not self.scenario.vector_layers:
+            return None
+        layers = []
+        for type_key in range(self.scenario.vector_layers):
+            steps = self.random.normal(0, 5, (self.scenario.vertices, 2))
+            start = self.random.random(2) * (WORLD_SIZE[2] - WORLD_SIZE[0])
+            coordinates = np.clip(start + np.cumsum(steps, axis=0), WORLD_SIZE[0], WORLD_SIZE[2])
+            layers.append({"t": type_key, "f": [{"geometry": {"type": "LineString",
+                                                               "coordinates": coordinates.round(3).tolist()}}]})
+        return json.dumps({"vectors": layers})
+
+    def raster_message(self):
+        """ One raster layer with raster x raster cells, None if the scenario has none. """
+        size = self.scenario.raster
+        if not size:
+            return None
+        cell_width = (WORLD_SIZE[2] - WORLD_SIZE[0]) / size
+        cell_height = (WORLD_SIZE[3] - WORLD_SIZE[1]) / size
+        xs, ys = np.meshgrid((np.arange(size) + 0.5) * cell_width, (np.arange(size) + 0.5) * cell_height)
+        values = self.random.integers(0, 255, size * size)
+        cells = np.column_stack([xs.ravel(), ys.ravel(), values]).round(3).tolist()
+        return json.dumps({"rasters": [{"t": 0, "cellWidth": cell_width, "cellHeight": cell_height,
+                                        "cells": cells}]})
+
+    def initial_messages(self):
+        return [message for message in (self.world_message(), self.vector_message(), self.raster_message())
+                if message is not None]
+
+    def step(self):
+        """ Moves all agents and advances the tick. """
+        for xs, ys in self.positions:
+            xs += self.random.normal(0, 1, len(xs))
+            ys += self.random.normal(0, 1, len(ys))
+            np.clip(xs, WORLD_SIZE[0], WORLD_SIZE[2], out=xs)
+            np.clip(ys, WORLD_SIZE[1], WORLD_SIZE[3], out=ys)
+        self.tick += 1
+
+    def tick_messages(self, binary):
+        """ Entity messages of the current tick, one binary frame for all types or one JSON message per type. """
+        max_ticks = self.scenario.ticks
+        if binary:
+            columns = {type_key: protocol.EntityColumns(xs, ys) for type_key, (xs, ys) in enumerate(self.positions)}
+            return [protocol.encode_frame(columns, self.tick, max_ticks)]
+        return [json.dumps({"t": type_key, "currentTick": self.tick, "maxTicks": max_ticks,
+                            "entities": [{"x": x, "y": y} for x, y in zip(xs.tolist(), ys.tolist())]})
+                for type_key, (xs, ys) in enumerate(self.positions)]
+
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + _GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def encode_ws_frame(payload, opcode):
+    """ Unmasked server-to-client frame. """
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 1 << 16:
+        header += bytes([126]) + struct.pack(">H", length)
+    else:
+        header += bytes([127]) + struct.pack(">Q", length)
+    return header + payload
+
+
+def _receive_exactly(connection, count):
+    data = b""
+    while len(data) < count:
+        chunk = connection.recv(count - len(data))
+        if not chunk:
+            raise ConnectionError("client closed the connection")
+        data += chunk
+    return data
+
+
+def read_ws_frame(connection):
+    """ Reads one (masked) client frame, returns opcode and payload. """
+    first, second = _receive_exactly(connection, 2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", _receive_exactly(connection, 2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", _receive_exactly(connection, 8))[0]
+    mask = _receive_exactly(connection, 4) if second & 0x80 else None
+    payload = _receive_exactly(connection, length)
+    if mask is not None:
+        payload = (np.frombuffer(payload, dtype=np.uint8) ^ np.resize(np.frombuffer(mask, dtype=np.uint8),
+                                                                       length)).tobytes()
+    return first & 0x0F, payload
+
+
+class ClientSession:
+    """ One connected visualization client. """
+
+    def __init__(self, connection, scenario, seed):
+        self.connection = connection
+        self.simulation = SyntheticSimulation(scenario, seed)
+        self.binary = False
+        self.time_to_wait_ms = 0
+        self.frame_interval = 1
+        self.open = True
+        self.sent_messages = 0
+        self.sent_bytes = 0
+        self.negotiated = threading.Event()
+        self._send_lock = threading.Lock()
+
+    def handshake(self):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = self.connection.recv(4096)
+            if not chunk:
+                raise ConnectionError("client closed the connection during the handshake")
+            request += chunk
+        headers = {}
+        for line in request.decode("latin-1").split("\r\n")[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        self.connection.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                                 f"Sec-WebSocket-Accept: {_accept_key(headers['sec-websocket-key'])}\r\n\r\n")
+                                .encode("ascii"))
+
+    def send(self, message):
+        binary = isinstance(message, bytes)
+        payload = message if binary else message.encode("utf-8")
+        with self._send_lock:
+            self.connection.sendall(encode_ws_frame(payload, OPCODE_BINARY if binary else OPCODE_TEXT))
+        self.sent_messages += 1
+        self.sent_bytes += len(payload)
+
+    def read_loop(self):
+        try:
+            while self.open:
+                opcode, payload = read_ws_frame(self.connection)
+                if opcode == OPCODE_CLOSE:
+                    break
+                if opcode == OPCODE_PING:
+                    with self._send_lock:
+                        self.connection.sendall(encode_ws_frame(payload, OPCODE_PONG))
+                elif opcode == OPCODE_TEXT:
+                    self.handle_control(json.loads(payload.decode("utf-8")))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        self.open = False
+
+    def handle_control(self, message):
+        if "frameFormat" in message:
+            self.binary = message["frameFormat"] == protocol.FRAME_FORMAT_BINARY
+            self.negotiated.set()
+        if "timeToWaitInMilliseconds" in message:
+            self.time_to_wait_ms = max(0, message["timeToWaitInMilliseconds"])
+        if "frameInterval" in message:
+            self.frame_interval = max(1, message["frameInterval"])
+
+    def run(self):
+        try:
+            self.handshake()
+            threading.Thread(target=self.read_loop, daemon=True).start()
+            # clients that do not negotiate get JSON frames
+            self.negotiated.wait(1.0)
+            for message in self.simulation.initial_messages():
+                self.send(message)
+            scenario = self.simulation.scenario
+            next_tick = time.perf_counter()
+            while self.open and (not scenario.ticks or self.simulation.tick <= scenario.ticks):
+                if self.simulation.tick % self.frame_interval == 0:
+                    for message in self.simulation.tick_messages(self.binary):
+                        self.send(message)
+                self.simulation.step()
+                period = max(1 / scenario.rate if scenario.rate > 0 else 0.0, self.time_to_wait_ms / 1000)
+                next_tick = max(next_tick + period, time.perf_counter())
+                time.sleep(max(0.0, next_tick - time.perf_counter()))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.open = False
+            self.connection.close()
+
+
+class LoadServer:
+    def __init__(self, scenario, host="127.0.0.1", port=4567, seed=1):
+        self.scenario = scenario
+        self.seed = seed
+        self.sessions = []
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen()
+        self.host, self.port = self._socket.getsockname()[:2]
+        self.running = True
+
+    @property
+    def uri(self):
+        return f"ws://{self.host}:{self.port}/vis"
+
+    def serve_forever(self):
+        while self.running:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                break
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = ClientSession(connection, self.scenario, self.seed)
+            self.sessions.append(session)
+            threading.Thread(target=session.run, daemon=True).start()
+
+    def start(self):
+        """ Serves on a background thread, returns the server. """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.running = False
+        for session in self.sessions:
+            session.open = False
+        self._socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic frames to the visualization.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4567)
+    parser.add_argument("--entities", type=int, default=1000, help="Entities per type")
+    parser.add_argument("--types", type=int, default=1, help="Number of entity types")
+    parser.add_argument("--vector-layers", type=int, default=0, help="Number of vector layers")
+    parser.add_argument("--vertices", type=int, default=1000, help="Vertices per vector layer")
+    parser.add_argument("--raster", type=int, default=0, help="Cells per side of a raster layer, 0 for none")
+    parser.add_argument("--rate", type=float, default=30.0, help="Ticks per second, 0 for as fast as possible")
+    parser.add_argument("--ticks", type=int, default=0, help="Number of ticks, 0 runs forever")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    scenario = Scenario(args.entities, args.types, args.vector_layers, args.vertices, args.raster, args.rate,
+                        args.ticks)
+    server = LoadServer(scenario, args.host, args.port, args.seed)
+    print(f"Serving {scenario} on {server.uri}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
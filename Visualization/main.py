@@ -1,42 +1,30 @@
 import _thread as thread
+import argparse
 import json
 import time
 from json import JSONDecodeError
 
 import pygame
 from pygame import RESIZABLE, DOUBLEBUF, HWSURFACE
-from websocket import create_connection, WebSocketConnectionClosedException
+from websocket import WebSocketException
 
-import lock
-
-GRAY = (100, 100, 100)
-NAVYBLUE = (60, 60, 100)
-WHITE = (255, 255, 255)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0, 80)
-BLUE = (0, 0, 255)
-YELLOW = (255, 255, 0)
-ORANGE = (255, 128, 0)
-PURPLE = (255, 0, 255)
-CYAN = (0, 255, 255)
-BLACK = (0, 0, 0)
-
-GREEN_LIGHT = [149, 217, 104, 50]
-YELLOW_LIGHT = [205, 217, 104, 50]
-PURPLE_LIGHT = [162, 134, 222, 50]
-BLUE_LIGHT = [174, 218, 233, 50]
-
-RASTER_COLORS = [GREEN_LIGHT, YELLOW_LIGHT, PURPLE_LIGHT, BLUE_LIGHT]
-VECTOR_COLORS = [RED, WHITE, BLUE, ORANGE, YELLOW]
-# COLORS = [NAVYBLUE, RED, WHITE, BLUE, ORANGE, PURPLE, CYAN]  # without WHITE for background
-
-COLORS = VECTOR_COLORS
+import pipeline
+from feeds import Feed, TickMerger
+from frame_timing import FrameTimings
+import protocol
+import recording
+from scene import Scene, BLACK, YELLOW, WHITE
+from throttle import ThrottleController
 
 WINDOW_SIZE = 800, 800
+DEFAULT_URI = "ws://127.0.0.1:4567/vis"
+SEEK_TICKS = 100
+TIMING_COLUMN_WIDTH = 70
 
 
 class Visualization:
-    def __init__(self):
+    def __init__(self, uris=(DEFAULT_URI,), record_path=None, replay_path=None, replay_speed=1.0, start_tick=None,
+                 timings_path=None, show_timings=False, lag_window=10, auto_throttle=False, density=False):
         pygame.init()
         pygame.display.set_caption("MARS-Mini-VIS")
 
@@ -45,9 +33,13 @@ class Visualization:
 
         self.clock = pygame.time.Clock()
         self.WINDOW_SIZE = [800, 800]
-        self.WORLD_SIZE = 0, 0, 100, 100  # used for scaling
-        self.BORDER_WIDTH_PIXEL = -20
+        self.SURFACE_OFFSET = (10, -50)
         self.font = pygame.font.Font('freesansbold.ttf', 12)
+        self.timings = FrameTimings(export_path=timings_path)
+        self.show_timings = show_timings
+        self.scene = Scene(self.WINDOW_SIZE, self.font, self.timings)
+        self.glyphs = self.scene.glyphs
+        self.scene.density.enabled = density
         self.text = self.font.render('Tick: 0', True, YELLOW)
         self.fps_text = self.font.render('FPS: 0', True, YELLOW)
         self.desired_fps = self.font.render('Desired FPS: 0', True, YELLOW)
@@ -55,24 +47,26 @@ class Visualization:
         self.fpsTextRect = self.fps_text.get_rect()
         self.desired_fpsRect = self.desired_fps.get_rect()
 
-        self.l = lock.RWLock()
+        self.frames = pipeline.LatestFrameQueue()
+        self.merger = TickMerger(self.frames, lag_window)
+        self.frames_rendered = 0
+        self.ticks_skipped = 0
+        self.rendered_ticks = {}
         self.pressed_up = False
         self.pressed_down = False
-        self.entities = {}
-        self.point_features = []
-        self.multi_point_features = []
-        self.line_features = []
-        self.ring_features = []
-        self.polygon_features = []
-        self.multi_polygon_features = []
-        self.raster_metadata = {}
-        self.tick_display = [False, 0, 1000]
+        self.drag_start = None
         self.fps = 60
         self.run = True
-        self.uri = "ws://127.0.0.1:4567/vis"
-        self.ws = None
+        if isinstance(uris, str):
+            uris = [uris]
+        self.feeds = [Feed(index, uri, self.on_connect, self.on_disconnect) for index, uri in enumerate(uris)]
+        self.recorder = recording.Recorder(record_path) if record_path else None
+        self.replayer = recording.Replayer(recording.Recording(replay_path), replay_speed) if replay_path else None
+        self.start_tick = start_tick
+        self.binary_frames = True
+        self.entity_deltas = True
         self.desired_fps = self.fps
-        self.time_to_wait_milliseconds = 10
+        self.throttle = ThrottleController(time_to_wait_ms=10, enabled=auto_throttle)
         self.borderColor = (255, 255, 255)
         self.barColor = (0, 128, 0)
         self.set_window_relations(800, 800)
@@ -80,207 +74,153 @@ class Visualization:
     def set_window_relations(self, width, height):
         self.WINDOW_SIZE[0] = width
         self.WINDOW_SIZE[1] = height
+        self.scene.WINDOW_SIZE = list(self.WINDOW_SIZE)
         self.textRect.center = (30, height - 12)
         self.fpsTextRect.center = (120, height - 12)
         self.desired_fpsRect.center = (230, height - 12)
+        self.pipelineTextPos = (10, height - 58)
+        self.throttleTextPos = (10, height - 74)
+        self.connectionTextPos = (10, height - 90)
         self.barPos = (10, height - 40)
         self.barSize = (self.WINDOW_SIZE[0] - 20, 20)
         self.screen = pygame.display.set_mode((self.WINDOW_SIZE[0], height),
                                               HWSURFACE | DOUBLEBUF | RESIZABLE)
 
-    def get_socket(self):
-        ws = None
-        while ws is None:
-            try:
-                ws = create_connection(self.uri)
-                print("Connecting to simulation ...")
-            except (ConnectionResetError, ConnectionRefusedError, TimeoutError, WebSocketConnectionClosedException):
-                print("Waiting for running simulation ... ")
-                time.sleep(2)
-                ws = None
-
-        return ws
-
-    def load_data(self):
-        if self.ws is None:
-            self.ws = self.get_socket()
+    def on_connect(self, feed):
+        """ Messages sent to a feed after connecting: the frame format and the vector layers already held. """
+        messages = [protocol.negotiation_message(self.binary_frames, self.entity_deltas)]
+        known_layers = self.scene.vectors.known_layers(feed.index)
+        if known_layers:
+            messages.append(json.dumps({"knownVectorLayers": known_layers}))
+        if self.throttle.enabled:
+            messages.append(protocol.pace_message(self.throttle.time_to_wait_ms, self.throttle.frame_interval))
+        if feed.connections > 0:
+            # the entities of the previous connection stay visible until the keyframe replaces them
+            messages.append(protocol.keyframe_request_message())
+            feed.awaiting_keyframe = True
+        return messages
+
+    def on_disconnect(self, feed):
+        self.merger.forget(feed.index)
+
+    def receive_data(self, feed):
+        ws = feed.connect()
+        if ws is None:
+            time.sleep(min(0.1, feed.retry_in()))
+            return
         try:
-            message = self.ws.recv()
+            with self.timings.measure("receive"):
+                message = ws.recv()
             if message is None or message == "":
                 return
             # print(message)
-            data = json.loads(message)
-
-            self.l.acquire_write()
-            if "currentTick" in data:
-                self.tick_display[1] = data["currentTick"]
-            if "maxTicks" in data:
-                self.tick_display[2] = data["maxTicks"]
-
-            if "entities" in data:
-                entities_points = data["entities"]
-                self.entities[data['t']] = entities_points
-            if "worldSize" in data:
-                world_data = data["worldSize"]
-                if world_data["maxX"] > 0:
-                    self.WORLD_SIZE = world_data["minX"], world_data["minY"], world_data["maxX"], world_data["maxY"]
-            if "vectors" in data:
-                layers_data = data["vectors"]
-                for layer in layers_data:
-                    if "f" in layer and "t" in layer:
-                        features = layer["f"]
-                        type_key = layer["t"]
-                        self.load_vector_data(features, type_key)
-                    else:
-                        self.load_vector_data(layer, -1)
-
-            if "rasters" in data:
-                raster_data = data["rasters"]
-                for raster in raster_data:
-                    proxy_key = raster["t"]
-                    self.raster_metadata[proxy_key] = raster
-
-            self.tick_display[0] = True
-            self.l.release_write()
-        except (ConnectionResetError, ConnectionRefusedError, WebSocketConnectionClosedException, JSONDecodeError):
-            self.ws.shutdown()
-            self.entities.clear()
-            if self.l.get_active_writer() > 0:
-                self.l.release_write()
-            self.screen.fill(BLACK)
-            self.ws = None
-
-    def load_vector_data(self, features, type_key):
-        for feature in features:
-            geometry = feature["geometry"]
-            geometry_type = geometry["type"]
-            if geometry_type == "LineString":
-                self.line_features.append(geometry)
-            elif geometry_type == "LineRing":
-                self.ring_features.append(geometry)
-            elif geometry_type == "Point":
-                self.point_features.append(geometry)
-            elif geometry_type == "MultiPoint":
-                self.multi_point_features.append(geometry)
-            elif geometry_type == "Polygon":
-                self.polygon_features.append(geometry)
-            elif geometry_type == "MultiPolygon":
-                self.multi_polygon_features.append(geometry)
+            with self.timings.measure("decode"):
+                data = protocol.decode_message(message)
+            data["feed"] = feed.index
+            feed.received()
+            if self.recorder is not None:
+                self.recorder.append(message, data)
+            self.merger.put(data)
+        except (OSError, WebSocketException, JSONDecodeError, protocol.FrameFormatError):
+            feed.disconnect(ws)
+
+    def receive_loop(self, feed):
+        while self.run:
+            self.receive_data(feed)
+
+    def replay_loop(self):
+        self.replayer.play(self.merger, lambda: self.run, self.start_tick)
+
+    def load_data(self, timeout=None):
+        """ Applies the queued frames to the scene and publishes the result, runs in the decoder thread. """
+        frames = self.frames.drain(timeout)
+        if not frames:
+            return
+        with self.timings.measure("apply"):
+            for data in frames:
+                if "reset" in data:
+                    self.scene.reset(data.get("feed"))
+                else:
+                    self.scene.apply_frame(data)
+            self.scene.publish()
+        for feed in self.feeds:
+            if any(needed_feed == feed.index for needed_feed, _ in self.scene.keyframes_needed):
+                feed.request_keyframe()
+            else:
+                feed.awaiting_keyframe = False
+
+    def decode_loop(self):
+        while self.run:
+            self.load_data(timeout=0.1)
 
     def visualize_content(self):
 
         self.clock.tick(self.desired_fps)
-        self.load_data()
-
-        # if not self.tick_display[0]:
-        #   return
+        snapshot = self.scene.snapshot
+        # ticks of a feed that were applied after the last rendered frame, but replaced before this one
+        applied_ticks = snapshot.applied_ticks or {}
+        self.ticks_skipped += sum(max(0, count - self.rendered_ticks.get(feed, 0) - 1)
+                                  for feed, count in applied_ticks.items())
+        self.rendered_ticks = applied_ticks
 
         self.screen.fill(BLACK)
 
-        # window_area = (10, 10,self.WINDOW_SIZE[0] - 10, self.WINDOW_SIZE[1] - 10)
-
-        delta_x = self.WORLD_SIZE[2] - self.WORLD_SIZE[0]
-        delta_y = self.WORLD_SIZE[3] - self.WORLD_SIZE[1]
-
-        scale_x = self.WINDOW_SIZE[0] / delta_x
-        scale_y = self.WINDOW_SIZE[1] / delta_y
-
-        # scale_x = window_area[2] / delta_x
-        # scale_y = window_area[3] / delta_y
-
-        # scale_x = (self.WINDOW_SIZE[0] - (self.WORLD_SIZE[0])) / self.WORLD_SIZE[2]
-        # scale_y = (self.WINDOW_SIZE[1] - (self.WORLD_SIZE[1] + 50)) / self.WORLD_SIZE[3]
-
-        # line_width = int((scale_x + scale_y) / 2)
-        line_width = 1;
-
-        surface = pygame.Surface(self.WINDOW_SIZE)
-
-        for raster_key in self.raster_metadata.keys():
-            raster = self.raster_metadata[raster_key]
-            width = raster["cellWidth"] * scale_x
-            height = raster["cellHeight"] * scale_y
-            cells_with_value = raster["cells"]
-            for cell in cells_with_value:
-                x = ((cell[0] - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL
-                y = ((cell[1] - self.WORLD_SIZE[1]) * scale_y)
-                value = cell[2] % 255
-                color = RASTER_COLORS[raster_key % len(RASTER_COLORS)]
-                color[3] = value
-                pygame.draw.rect(surface, color, pygame.Rect(x - width / 2, y - height / 2, width + 1, height + 1))
-
-        for geometry in self.multi_polygon_features:
-            multi_set = geometry["coordinates"]
-            for polygon_geometry_list in multi_set:
-                for coordinates in polygon_geometry_list:
-                    pointlist = [(
-                        (float(x[0] - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL,
-                        (float(x[1] - self.WORLD_SIZE[1]) * scale_y)) for x in coordinates]
-                    pygame.draw.polygon(surface, GREEN, pointlist, 0)
-
-        for geometry in self.polygon_features:
-            polygon_geometry_list = geometry["coordinates"]
-            for coordinates in polygon_geometry_list:
-                pointlist = [(
-                    (float(x[0] - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL,
-                    (float(x[1] - self.WORLD_SIZE[1]) * scale_y)) for x in coordinates]
-                pygame.draw.polygon(surface, GREEN, pointlist, 0)
-
-        for geometry in self.line_features:
-            line_feature = [(
-                (float(x[0] - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL,
-                ((float(x[1]) - self.WORLD_SIZE[1]) * scale_y)) for x in geometry["coordinates"]]
-            pygame.draw.lines(surface, PURPLE, False, line_feature, line_width)
-
-        for geometry in self.ring_features:
-            pointlist = [(
-                ((float(x[0]) - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL,
-                ((float(x[1]) - self.WORLD_SIZE[1]) * scale_y)) for x in geometry["coordinates"]]
-            pygame.draw.polygon(surface, ORANGE, pointlist, line_width)
-
-        for geometry in self.point_features:
-            point = geometry["coordinates"]
-            point_feature = (((float(point[0]) - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL,
-                             ((float(point[1]) - self.WORLD_SIZE[1]) * scale_y))
-            pygame.draw.circle(surface, BLUE, (point_feature[0], point_feature[1]), line_width, 0)
-
-        for geometry in self.multi_point_features:
-            point_set = geometry["coordinates"]
-            for point in point_set:
-                point_feature = (((float(point[0]) - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL,
-                                 ((float(point[1]) - self.WORLD_SIZE[1]) * scale_y))
-                pygame.draw.circle(surface, BLUE, (point_feature[0], point_feature[1]), line_width, 0)
-
-        for type_key in self.entities.keys():
-            for entity in self.entities[type_key]:
-                x = entity["x"]
-                y = entity["y"]
-
-                pos = (((x - self.WORLD_SIZE[0]) * scale_x) + self.BORDER_WIDTH_PIXEL,
-                       ((y - self.WORLD_SIZE[1]) * scale_y))
-                pygame.draw.circle(surface, COLORS[type_key % len(COLORS)], pos, line_width, 0)
-
-                # access the property values of each agent using
-                if 'p' in entity:
-                    for key in entity['p'].keys():
-                        value = entity["p"][key]
-                        label = self.font.render(str(value), True, (255, 255, 255))
-                        surface.blit(label, pos)
+        frame_start = time.perf_counter_ns()
+        surface = self.scene.render(snapshot=snapshot)
+        blit_start = time.perf_counter_ns()
 
         flipped = pygame.transform.flip(surface, False, False)
-        self.screen.blit(flipped, (10, -50))
+        self.screen.blit(flipped, self.SURFACE_OFFSET)
 
-        self.screen.blit(self.font.render(f'Tick: {self.tick_display[1]}', True, WHITE), self.textRect)
-        self.screen.blit(self.font.render(f'FPS: {round(self.clock.get_fps(), 2)}', True, WHITE), self.fpsTextRect)
+        self.screen.blit(self.glyphs.render(f'Tick: {snapshot.tick}', WHITE), self.textRect)
+        self.screen.blit(self.glyphs.render(f'FPS: {round(self.clock.get_fps(), 1)}', WHITE), self.fpsTextRect)
         self.screen.blit(
-            self.font.render(f'Desired FPS: {self.desired_fps} (use up- and down arrows to change)', True, WHITE),
+            self.glyphs.render(f'Desired FPS: {self.desired_fps} (use up- and down arrows to change)', WHITE),
             self.desired_fpsRect)
 
-        if self.tick_display[2] != 0:
-            progress = self.tick_display[1] / self.tick_display[2]
+        self.screen.blit(
+            self.glyphs.render(f'Received: {self.frames.received_frames}  Dropped: {self.frames.dropped_frames}  '
+                               f'Skipped: {self.ticks_skipped}  Rendered: {self.frames_rendered}  '
+                               f'Queue latency: {self.frames.latency_ms:.1f} ms' +
+                               (f'  Held: {self.merger.held_frames}' if len(self.feeds) > 1 else ''), WHITE),
+            self.pipelineTextPos)
+        self.screen.blit(self.glyphs.render(self.throttle.describe(), WHITE), self.throttleTextPos)
+        reconnecting = [feed for feed in self.feeds if feed.reconnecting]
+        if reconnecting and self.replayer is None:
+            status = "  ".join(f"Reconnecting to {feed.uri} in {feed.retry_in():.1f} s (attempt {feed.attempts})"
+                               for feed in reconnecting)
+            self.screen.blit(self.glyphs.render(status, YELLOW), self.connectionTextPos)
+
+        if snapshot.max_ticks != 0:
+            progress = snapshot.tick / snapshot.max_ticks
             self.draw_progress(self.barPos, self.barSize, self.borderColor, self.barColor, progress)
 
+        if self.show_timings:
+            self.draw_timings()
+
         pygame.display.update()
+        self.timings.add("blit", (time.perf_counter_ns() - blit_start) / 1e6)
+        self.timings.end_frame()
+        self.frames_rendered += 1
+
+        # frames held back by the merger measure the skew between the feeds, not the load of the viewer
+        pace = self.throttle.observe((time.perf_counter_ns() - frame_start) / 1e6, len(self.frames),
+                                     self.coalesced_frames, 1000 / max(self.desired_fps, 1))
+        if pace is not None:
+            self.send_message(protocol.pace_message(*pace))
+
+    @property
+    def coalesced_frames(self):
+        """ Frames replaced by a newer one before they were drawn, in the queue or after they were applied. """
+        return self.frames.dropped_frames + self.ticks_skipped
+
+    def draw_timings(self):
+        """ Overlay with the rolling percentiles of the pipeline stages, toggled with F3. """
+        line_height = self.font.get_linesize()
+        for row_index, row in enumerate(self.timings.summary_rows()):
+            for column_index, cell in enumerate(row):
+                self.screen.blit(self.glyphs.render(cell, YELLOW),
+                                 (10 + column_index * TIMING_COLUMN_WIDTH, 10 + row_index * line_height))
 
     def draw_progress(self, pos, size, border_c, bar_c, progress):
         pygame.draw.rect(self.screen, border_c, (*pos, *size), 1)
@@ -301,6 +241,18 @@ class Visualization:
                 if height < 500:
                     height = 500
                 self.set_window_relations(width, height)
+            self.handle_viewport_event(event)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.show_timings = not self.show_timings
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+                self.scene.density.enabled = not self.scene.density.enabled
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                self.throttle.enabled = not self.throttle.enabled
+            if event.type == pygame.KEYDOWN and self.replayer is not None:
+                if event.key == pygame.K_PAGEDOWN:
+                    self.replayer.seek(self.replayer.tick + SEEK_TICKS)
+                elif event.key == pygame.K_PAGEUP:
+                    self.replayer.seek(self.replayer.tick - SEEK_TICKS)
         keys = pygame.key.get_pressed()
         if keys[pygame.K_DOWN]:
             self.desired_fps = (self.desired_fps - 3)
@@ -310,25 +262,45 @@ class Visualization:
             self.desired_fps = (self.desired_fps + 3)
             if self.desired_fps >= 1000:
                 self.desired_fps = 1000
-        elif keys[pygame.K_LEFT] and self.ws is not None:
+        elif keys[pygame.K_LEFT] and self.replayer is not None:
+            self.replayer.set_speed(self.replayer.speed / 1.05)
+        elif keys[pygame.K_RIGHT] and self.replayer is not None:
+            self.replayer.set_speed(self.replayer.speed * 1.05)
+        elif keys[pygame.K_LEFT]:
             self.speed_adjustment(3)
-        elif keys[pygame.K_RIGHT] and self.ws is not None:
+        elif keys[pygame.K_RIGHT]:
             self.speed_adjustment(-3)
 
+    def handle_viewport_event(self, event):
+        """ Mouse wheel zooms around the cursor, dragging with the left button pans, Home resets the view. """
+        scene = self.scene
+        if event.type == pygame.MOUSEWHEEL and scene.projection is not None:
+            x, y = self.surface_position(pygame.mouse.get_pos())
+            factor = 1.25 if event.y > 0 else 0.8
+            scene.zoom, scene.pan = scene.projection.zoomed_at(factor, x, y)
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.drag_start = event.pos, scene.pan
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.drag_start = None
+        elif event.type == pygame.MOUSEMOTION and self.drag_start is not None:
+            (start_x, start_y), (pan_x, pan_y) = self.drag_start
+            scene.pan = (pan_x + event.pos[0] - start_x, pan_y + event.pos[1] - start_y)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_HOME:
+            scene.zoom, scene.pan = 1.0, (0.0, 0.0)
+
+    def surface_position(self, screen_position):
+        return screen_position[0] - self.SURFACE_OFFSET[0], screen_position[1] - self.SURFACE_OFFSET[1]
+
     def speed_adjustment(self, speed_change):
-        self.time_to_wait_milliseconds = (self.time_to_wait_milliseconds + speed_change)
-        if self.time_to_wait_milliseconds < 0:
-            self.time_to_wait_milliseconds = 0
-        try:
-            self.ws.send(json.dumps({"timeToWaitInMilliseconds": self.time_to_wait_milliseconds}))
-        except (BrokenPipeError, ConnectionResetError, ConnectionRefusedError, WebSocketConnectionClosedException,
-                JSONDecodeError):
-            self.ws.shutdown()
-            self.entities.clear()
-            if self.l.get_active_writer() > 0:
-                self.l.release_write()
-            self.screen.fill(BLACK)
-            self.ws = None
+        frame_interval = self.throttle.frame_interval
+        self.throttle.set_manual(self.throttle.time_to_wait_ms + speed_change)
+        self.send_message(protocol.pace_message(self.throttle.time_to_wait_ms,
+                                                1 if frame_interval != 1 else None))
+
+    def send_message(self, message):
+        """ Sends a control message to every feed, so all simulation processes keep the same pace. """
+        for feed in self.feeds:
+            feed.send(message)
 
     def content_loop(self):
         try:
@@ -339,6 +311,12 @@ class Visualization:
 
     def visualization_loop(self):
         try:
+            if self.replayer is not None:
+                thread.start_new_thread(self.replay_loop, ())
+            else:
+                for feed in self.feeds:
+                    thread.start_new_thread(self.receive_loop, (feed,))
+            thread.start_new_thread(self.decode_loop, ())
             thread.start_new_thread(self.content_loop, ())
             while self.run:
                 self.clock.tick(self.desired_fps)
@@ -347,8 +325,36 @@ class Visualization:
         except KeyboardInterrupt:
             self.run = False
         finally:
+            if self.recorder is not None:
+                self.recorder.close()
+            self.timings.close()
             pygame.quit()
 
 
-vis = Visualization()
-vis.visualization_loop()
+def main():
+    parser = argparse.ArgumentParser(description="MARS mini visualization")
+    parser.add_argument("--uri", action="append",
+                        help=f"Websocket of a simulation process, repeat for several (default: {DEFAULT_URI})")
+    parser.add_argument("--lag-window", type=int, default=10,
+                        help="Ticks a feed may run ahead of the others before it is no longer held back")
+    parser.add_argument("--record", help="Record the received stream to this new file")
+    parser.add_argument("--replay", help="Play a recording instead of connecting to a simulation")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor, 0 plays as fast as possible")
+    parser.add_argument("--start-tick", type=int, help="Tick to start the replay at")
+    parser.add_argument("--auto-throttle", action="store_true",
+                        help="Adapt the simulation pace to the viewer (toggle: A, arrow keys switch it off)")
+    parser.add_argument("--density", action="store_true", help="Show the entity density overlay (toggle: H)")
+    parser.add_argument("--timings", help="Write the stage times of every frame to this .csv or .jsonl file")
+    parser.add_argument("--show-timings", action="store_true", help="Show the stage timing overlay (toggle: F3)")
+    args = parser.parse_args()
+
+    try:
+        vis = Visualization(args.uri or [DEFAULT_URI], args.record, args.replay, args.speed, args.start_tick,
+                            args.timings, args.show_timings, args.lag_window, args.auto_throttle, args.density)
+    except ValueError as error:
+        parser.error(str(error))
+    vis.visualization_loop()
+
+
+if __name__ == "__main__":
+    main()
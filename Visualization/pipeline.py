@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+"""
+Hand-over between the receiver thread, which reads and decodes websocket frames, and the render loop.
+
+Frames that carry a key replace a queued frame with the same key, so the renderer only ever applies the newest
+entity positions of a type. Frames without a key (vector and raster layers, connection resets) can not be
+reconstructed from a later frame and are never dropped. The same holds for entity deltas, except that a keyframe
+of their type supersedes them. Frames of different feeds (see feeds.py) never replace each other.
+
+A simulation sends the world size and max ticks only now and then, so a dropped frame passes them on to the next queued
+frame of its feed that does not carry its own, or to a frame of their own if there is none.
+"""
+
+STICKY_KEYS = ("worldSize", "maxTicks")
+
+
+def _delta_types(data):
+    feed = data.get("feed", 0)
+    if "delta" in data:
+        return {(feed, data.get("t"))}
+    if "entityColumns" in data:
+        return {(feed, type_key) for type_key, columns in data["entityColumns"].items() if columns.delta}
+    return set()
+
+
+def _keyframe_types(data):
+    feed = data.get("feed", 0)
+    if "entities" in data:
+        return {(feed, data.get("t"))}
+    if "entityColumns" in data:
+        return {(feed, type_key) for type_key, columns in data["entityColumns"].items() if not columns.delta}
+    return set()
+
+
+def frame_key(data):
+    """ Coalescing key of a decoded frame, None if the frame must not be dropped. """
+    if "vectors" in data or "removedVectors" in data or "rasters" in data or "reset" in data or "delta" in data:
+        return None
+    if "entityColumns" in data and any(columns.delta for columns in data["entityColumns"].values()):
+        return None
+    feed = data.get("feed", 0)
+    if "entityColumns" in data:
+        return "entityColumns", feed
+    if "entities" in data:
+        return "entities", feed, data.get("t")
+    return "tick", feed
+
+
+_KEEP = object()
+
+
+class LatestFrameQueue:
+    """ Bounded, latest-frame-wins queue. Counters are written under the lock and may be read without it. """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._frames = OrderedDict()
+        self._sequence = 0
+
+        self.received_frames = 0
+        self.dropped_frames = 0
+        self.applied_frames = 0
+        self.latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, data):
+        key = frame_key(data)
+        now = time.perf_counter()
+        with self._lock:
+            self.received_frames += 1
+            if key is not None and key in self._frames:
+                self._drop(key, data)
+            elif len(self._frames) >= self.max_size:
+                self._drop_oldest_droppable(data)
+            if key is not None:
+                self._drop_superseded_deltas(_keyframe_types(data), data)
+            if key is None:
+                key = (_KEEP, self._sequence)
+                self._sequence += 1
+            self._frames[key] = (now, data)
+            self._ready.notify()
+
+    def _drop_superseded_deltas(self, keyframe_types, incoming):
+        if not keyframe_types:
+            return
+        superseded = [key for key, (_, data) in self._frames.items()
+                      if key[0] is _KEEP and _delta_types(data) and _delta_types(data) <= keyframe_types]
+        for key in superseded:
+            self._drop(key, incoming)
+
+    def _drop_oldest_droppable(self, incoming):
+        for key in self._frames:
+            if key[0] is not _KEEP:
+                self._drop(key, incoming)
+                return
+
+    def _drop(self, key, incoming):
+        """ Removes a queued frame, its world size and max ticks go to the next frame of its feed. """
+        keys = list(self._frames)
+        later = [self._frames[later_key][1] for later_key in keys[keys.index(key) + 1:]] + [incoming]
+        queued_at, dropped = self._frames.pop(key)
+        self.dropped_frames += 1
+
+        state = {name: dropped[name] for name in STICKY_KEYS if name in dropped}
+        if not state:
+            return
+        feed = dropped.get("feed", 0)
+        for data in later:
+            if data.get("feed", 0) == feed and "reset" not in data:
+                for name, value in state.items():
+                    data.setdefault(name, value)
+                return
+        state["feed"] = feed
+        self._frames[_KEEP, self._sequence] = (queued_at, state)
+        self._sequence += 1
+
+    def drain(self, timeout=None):
+        """ Removes and returns all queued frames in arrival order, waits up to timeout seconds for a first one. """
+        with self._lock:
+            if not self._frames and timeout:
+                self._ready.wait(timeout)
+            frames = list(self._frames.values())
+            self._frames.clear()
+            self.applied_frames += len(frames)
+        if frames:
+            now = time.perf_counter()
+            self.latency_ms = (now - frames[0][0]) * 1000
+            self.max_latency_ms = max(self.max_latency_ms, self.latency_ms)
+        return [data for _, data in frames]
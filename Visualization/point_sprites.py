@@ -0,0 +1,47 @@
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+"""
+Batched drawing of many small points of one color.
+
+Drawing every entity with its own pygame.draw.circle call costs a Python call per entity, which dominates the
+frame time for tens of thousands of agents. Instead, the pixels of all points of a type are written into the
+surface at once through pygame.surfarray with NumPy fancy indexing. A point of radius r covers the pixels of a
+precomputed stamp: the offsets of the pixels that pygame.draw.circle fills for that radius, so both paths draw
+the same shapes.
+"""
+
+
+@lru_cache(maxsize=16)
+def stamp_offsets(radius):
+    """ x and y pixel offsets of a filled circle with the given radius, relative to its (truncated) center. """
+    if radius < 1:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    size = 2 * radius + 3
+    stamp = pygame.Surface((size, size), depth=32)
+    pygame.draw.circle(stamp, (255, 255, 255), (radius + 1, radius + 1), radius, 0)
+    dx, dy = np.nonzero(pygame.surfarray.array2d(stamp))
+    return dx - (radius + 1), dy - (radius + 1)
+
+
+def draw_points(surface, xs, ys, color, radius=1):
+    """ Draws filled circles at the screen positions xs, ys in a single write, points outside are clipped. """
+    if len(xs) == 0:
+        return
+    dx, dy = stamp_offsets(radius)
+    px = (xs.astype(np.int64)[:, None] + dx).ravel()
+    py = (ys.astype(np.int64)[:, None] + dy).ravel()
+    width, height = surface.get_size()
+    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+
+    if surface.get_bytesize() == 3:
+        # 24 bit surfaces have no integer pixel view
+        pixels, value = pygame.surfarray.pixels3d(surface), tuple(color[:3])
+    else:
+        pixels, value = pygame.surfarray.pixels2d(surface), surface.map_rgb(color)
+    try:
+        pixels[px[inside], py[inside]] = value
+    finally:
+        del pixels
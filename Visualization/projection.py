@@ -0,0 +1,46 @@
+"""
+Affine world-to-screen transform of the visualization.
+
+The whole world fits the window at zoom 1; zoom scales around the world origin and pan shifts the result by
+pixels. The key of a projection changes whenever the world size, the window size, the border, the zoom or the
+pan changes, so buffers projected with it can be cached under that key.
+"""
+
+
+class Projection:
+    def __init__(self, world_size, window_size, border_width_pixel, zoom=1.0, pan=(0.0, 0.0)):
+        self.world_size = tuple(world_size)
+        self.window_size = tuple(window_size)
+        self.border_width_pixel = border_width_pixel
+        self.zoom = zoom
+        self.pan = tuple(pan)
+
+        delta_x = self.world_size[2] - self.world_size[0]
+        delta_y = self.world_size[3] - self.world_size[1]
+        self.scale_x = self.window_size[0] / delta_x * zoom
+        self.scale_y = self.window_size[1] / delta_y * zoom
+        self.offset_x = border_width_pixel + self.pan[0] - self.world_size[0] * self.scale_x
+        self.offset_y = self.pan[1] - self.world_size[1] * self.scale_y
+
+        self.key = (self.world_size, self.window_size, border_width_pixel, zoom, self.pan)
+
+    def project(self, xs, ys):
+        """ Projects scalars or numpy arrays of world coordinates to screen coordinates. """
+        return xs * self.scale_x + self.offset_x, ys * self.scale_y + self.offset_y
+
+    def unproject(self, xs, ys):
+        """ Projects screen coordinates back to world coordinates. """
+        return (xs - self.offset_x) / self.scale_x, (ys - self.offset_y) / self.scale_y
+
+    def visible_bounds(self, margin_pixel=0):
+        """ World bounding box (min x, min y, max x, max y) of the window area. """
+        min_x, min_y = self.unproject(-margin_pixel, -margin_pixel)
+        max_x, max_y = self.unproject(self.window_size[0] + margin_pixel, self.window_size[1] + margin_pixel)
+        return min(min_x, max_x), min(min_y, max_y), max(min_x, max_x), max(min_y, max_y)
+
+    def zoomed_at(self, factor, x, y):
+        """ Zoom and pan that scale the view by factor while keeping the screen position x, y in place. """
+        zoom = self.zoom * factor
+        pan_x = (x - self.border_width_pixel) * (1 - factor) + factor * self.pan[0]
+        pan_y = y * (1 - factor) + factor * self.pan[1]
+        return zoom, (pan_x, pan_y)
@@ -0,0 +1,200 @@
+import json
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+"""
+Binary columnar frame protocol of the visualization websocket.
+
+A simulation that understands the frame format negotiation answers with binary websocket messages instead of
+JSON text. Each message packs all entity types of one tick as float32 x/y columns, so the client can view them
+with numpy.frombuffer without parsing or copying. Simulations that ignore the negotiation keep sending JSON, which
+is still decoded as before.
+
+Layout (little-endian, every block padded to 4 bytes):
+
+    header      magic "MVIS", version u8, flags u8, type count u16, current tick u32, max ticks u32
+    world size  minX, minY, maxX, maxY as float64 (only if FLAG_WORLD_SIZE is set)
+    type block  type key i32, entity count u32, property count u16, block flags u16 (reserved in version 1),
+                sequence u32 (version 2),
+                ids int64[count] (only if BLOCK_IDS is set),
+                x float32[count], y float32[count],
+                per property: name length u16, utf-8 name (padded), float32[count],
+                removed count u32, removed ids int64[removed count] (only if BLOCK_DELTA is set)
+
+A delta block upserts the listed ids (moving known and inserting unknown agents) and removes the removed ids from
+the entities of its type. It applies only on top of the block of the same type with the previous sequence number,
+a block without BLOCK_DELTA is a keyframe that replaces all entities of its type.
+
+The JSON counterpart of a delta is a message with "t", "seq" and a "delta" object holding "insert" (entity
+dictionaries with "id"), "move" ([id, x, y] records) and "remove" (ids). Full "entities" lists are keyframes.
+"""
+
+MAGIC = b"MVIS"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+FLAG_WORLD_SIZE = 0x01
+
+BLOCK_IDS = 0x01
+BLOCK_DELTA = 0x02
+
+FRAME_FORMAT_BINARY = "mvis-binary"
+FRAME_FORMAT_JSON = "json"
+
+_HEADER = struct.Struct("<4sBBHII")
+_WORLD_SIZE = struct.Struct("<4d")
+_TYPE_BLOCK = struct.Struct("<iIHH")
+_SEQUENCE = struct.Struct("<I")
+_COUNT = struct.Struct("<I")
+_NAME_LENGTH = struct.Struct("<H")
+
+EntityColumns = namedtuple("EntityColumns", ["x", "y", "properties", "ids", "removed", "sequence", "delta"],
+                           defaults=(None, None, None, None, False))
+
+
+class FrameFormatError(ValueError):
+    """ Raised when a binary message is not a valid frame of a supported version. """
+
+
+def negotiation_message(binary_frames=True, entity_deltas=True):
+    """ Message sent after connecting to ask the simulation for binary frames and entity deltas. """
+    return json.dumps({"frameFormat": FRAME_FORMAT_BINARY if binary_frames else FRAME_FORMAT_JSON,
+                       "frameVersions": list(SUPPORTED_VERSIONS),
+                       "entityDeltas": entity_deltas})
+
+
+def keyframe_request_message():
+    """ Asks the simulation to send full entity lists again, e.g. after a delta could not be applied. """
+    return json.dumps({"requestKeyframe": True})
+
+
+def pace_message(time_to_wait_ms, frame_interval=None):
+    """ Sets the wait between ticks and, optionally, that only every frame_interval-th tick is sent. """
+    message = {"timeToWaitInMilliseconds": time_to_wait_ms}
+    if frame_interval is not None:
+        message["frameInterval"] = frame_interval
+    return json.dumps(message)
+
+
+def is_binary_frame(message):
+    return isinstance(message, (bytes, bytearray, memoryview)) and bytes(message[:4]) == MAGIC
+
+
+def decode_message(message):
+    """ Decodes a websocket message of either format into the dictionary layout used by load_data. """
+    if is_binary_frame(message):
+        return decode_frame(message)
+    if isinstance(message, (bytes, bytearray)):
+        message = message.decode("utf-8")
+    return json.loads(message)
+
+
+def _padded(length):
+    return (length + 3) & ~3
+
+
+def decode_frame(buffer):
+    """ Decodes a binary frame, the returned columns are read-only views into the buffer. """
+    if len(buffer) < _HEADER.size:
+        raise FrameFormatError("Frame shorter than its header")
+    magic, version, flags, type_count, current_tick, max_ticks = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise FrameFormatError("Unknown frame magic %r" % magic)
+    if version not in SUPPORTED_VERSIONS:
+        raise FrameFormatError("Unsupported frame version %d" % version)
+
+    data = {"currentTick": current_tick, "maxTicks": max_ticks}
+    columns = {}
+    offset = _HEADER.size
+    try:
+        if flags & FLAG_WORLD_SIZE:
+            min_x, min_y, max_x, max_y = _WORLD_SIZE.unpack_from(buffer, offset)
+            data["worldSize"] = {"minX": min_x, "minY": min_y, "maxX": max_x, "maxY": max_y}
+            offset += _WORLD_SIZE.size
+
+        for _ in range(type_count):
+            type_key, count, property_count, block_flags = _TYPE_BLOCK.unpack_from(buffer, offset)
+            offset += _TYPE_BLOCK.size
+            sequence = None
+            if version >= 2:
+                (sequence,) = _SEQUENCE.unpack_from(buffer, offset)
+                offset += _SEQUENCE.size
+            else:
+                block_flags = 0
+
+            ids = None
+            if block_flags & (BLOCK_IDS | BLOCK_DELTA):
+                ids = np.frombuffer(buffer, dtype="<i8", count=count, offset=offset)
+                offset += count * 8
+            x = np.frombuffer(buffer, dtype="<f4", count=count, offset=offset)
+            offset += count * 4
+            y = np.frombuffer(buffer, dtype="<f4", count=count, offset=offset)
+            offset += count * 4
+
+            properties = {}
+            for _ in range(property_count):
+                (name_length,) = _NAME_LENGTH.unpack_from(buffer, offset)
+                offset += _NAME_LENGTH.size
+                name = bytes(buffer[offset:offset + name_length]).decode("utf-8")
+                offset += _padded(_NAME_LENGTH.size + name_length) - _NAME_LENGTH.size
+                properties[name] = np.frombuffer(buffer, dtype="<f4", count=count, offset=offset)
+                offset += count * 4
+
+            removed = None
+            if block_flags & BLOCK_DELTA:
+                (removed_count,) = _COUNT.unpack_from(buffer, offset)
+                offset += _COUNT.size
+                removed = np.frombuffer(buffer, dtype="<i8", count=removed_count, offset=offset)
+                offset += removed_count * 8
+
+            columns[type_key] = EntityColumns(x, y, properties, ids, removed, sequence,
+                                              bool(block_flags & BLOCK_DELTA))
+    except (struct.error, ValueError) as e:
+        raise FrameFormatError("Truncated frame: %s" % e) from e
+
+    data["entityColumns"] = columns
+    return data
+
+
+def encode_frame(entity_columns, current_tick=0, max_ticks=0, world_size=None, version=VERSION):
+    """
+    Encodes a binary frame. This is the reference for simulation side emitters and is used to produce
+    frames locally. entity_columns maps a type key to an EntityColumns or an (x, y[, properties]) tuple.
+    """
+    if version not in SUPPORTED_VERSIONS:
+        raise FrameFormatError("Unsupported frame version %d" % version)
+    flags = FLAG_WORLD_SIZE if world_size is not None else 0
+    parts = [_HEADER.pack(MAGIC, version, flags, len(entity_columns), current_tick, max_ticks)]
+    if world_size is not None:
+        parts.append(_WORLD_SIZE.pack(*world_size))
+
+    for type_key, column in entity_columns.items():
+        column = column if isinstance(column, EntityColumns) else EntityColumns(*column)
+        x, y = np.asarray(column.x, dtype="<f4"), np.asarray(column.y, dtype="<f4")
+        properties = column.properties or {}
+        block_flags = (BLOCK_IDS if column.ids is not None else 0) | (BLOCK_DELTA if column.delta else 0)
+        if block_flags and version < 2:
+            raise FrameFormatError("Ids and deltas require frame version 2")
+        if column.delta and column.ids is None:
+            raise FrameFormatError("Delta blocks require ids")
+
+        parts.append(_TYPE_BLOCK.pack(type_key, len(x), len(properties), block_flags))
+        if version >= 2:
+            parts.append(_SEQUENCE.pack(column.sequence or 0))
+        if block_flags:
+            parts.append(np.asarray(column.ids, dtype="<i8").tobytes())
+        parts.append(x.tobytes())
+        parts.append(y.tobytes())
+        for name, values in properties.items():
+            encoded_name = name.encode("utf-8")
+            name_block = _NAME_LENGTH.pack(len(encoded_name)) + encoded_name
+            parts.append(name_block.ljust(_padded(len(name_block)), b"\0"))
+            parts.append(np.asarray(values, dtype="<f4").tobytes())
+        if column.delta:
+            removed = np.asarray(column.removed if column.removed is not None else [], dtype="<i8")
+            parts.append(_COUNT.pack(len(removed)))
+            parts.append(removed.tobytes())
+
+    return b"".join(parts)
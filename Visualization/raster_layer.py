@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+import pygame
+
+"""
+Raster layers rendered as images instead of one rectangle per cell.
+
+The cell list of a raster is converted once per update into an RGBA image with one pixel per cell, using the
+cell value as alpha. Each frame blits a scaled copy of the part of that image inside the window, which is cached
+until the projection changes.
+
+The image is built in the 32 bit ARGB format of the surfaces it is blitted onto, not as an RGBA buffer: blitting
+a surface of another pixel format takes a per-pixel conversion on every frame, which is about ten times slower.
+"""
+
+
+def _surface(pixels):
+    """ Surface with per pixel alpha in the native format from a rows x columns x 4 RGBA array. """
+    rows, columns = pixels.shape[:2]
+    surface = pygame.Surface((columns, rows), pygame.SRCALPHA, 32)
+    pygame.surfarray.pixels3d(surface)[...] = pixels[..., :3].transpose(1, 0, 2)
+    pygame.surfarray.pixels_alpha(surface)[...] = pixels[..., 3].T
+    return surface
+
+
+class RasterImage:
+    def __init__(self, raster, color):
+        self.cell_width = raster["cellWidth"]
+        self.cell_height = raster["cellHeight"]
+
+        cells = np.asarray(raster["cells"], dtype=np.float64).reshape(-1, 3)
+        if len(cells) == 0:
+            self.image = None
+            return
+        self.origin_x = cells[:, 0].min()
+        self.origin_y = cells[:, 1].min()
+        columns = np.rint((cells[:, 0] - self.origin_x) / self.cell_width).astype(np.intp)
+        rows = np.rint((cells[:, 1] - self.origin_y) / self.cell_height).astype(np.intp)
+        self.columns = int(columns.max()) + 1
+        self.rows = int(rows.max()) + 1
+
+        pixels = np.zeros((self.rows, self.columns, 4), dtype=np.uint8)
+        pixels[..., :3] = color[:3]
+        pixels[rows, columns, 3] = (cells[:, 2] % 255).astype(np.uint8)
+        self.image = _surface(pixels)
+
+        self._scaled = None
+        self._scaled_key = None
+
+    @classmethod
+    def from_pixels(cls, pixels, origin_x, origin_y, cell_width, cell_height):
+        """ Image from a rows x columns x 4 RGBA array, origin is the center of the first cell. """
+        raster_image = cls.__new__(cls)
+        raster_image.cell_width = cell_width
+        raster_image.cell_height = cell_height
+        raster_image.origin_x = origin_x
+        raster_image.origin_y = origin_y
+        raster_image.rows, raster_image.columns = pixels.shape[:2]
+        raster_image.image = _surface(pixels)
+        raster_image._scaled = None
+        raster_image._scaled_key = None
+        return raster_image
+
+    def scaled(self, projection):
+        """
+        The visible part of the image scaled to the projection and its top left screen position, None if the
+        raster is empty or outside of the window.
+        """
+        if self.image is None:
+            return None
+        if self._scaled_key != projection.key:
+            self._scaled = self._scale_visible_part(projection)
+            self._scaled_key = projection.key
+        return self._scaled
+
+    def _scale_visible_part(self, projection):
+        left, top = projection.project(self.origin_x - self.cell_width / 2, self.origin_y - self.cell_height / 2)
+        pixel_width = self.cell_width * projection.scale_x
+        pixel_height = self.cell_height * projection.scale_y
+
+        first_column = max(0, math.floor(-left / pixel_width))
+        last_column = min(self.columns, math.ceil((projection.window_size[0] - left) / pixel_width))
+        first_row = max(0, math.floor(-top / pixel_height))
+        last_row = min(self.rows, math.ceil((projection.window_size[1] - top) / pixel_height))
+        if first_column >= last_column or first_row >= last_row:
+            return None
+
+        visible = self.image.subsurface((first_column, first_row, last_column - first_column, last_row - first_row))
+        width = max(1, round((last_column - first_column) * pixel_width))
+        height = max(1, round((last_row - first_row) * pixel_height))
+        return pygame.transform.scale(visible, (width, height)), (left + first_column * pixel_width,
+                                                                 top + first_row * pixel_height)
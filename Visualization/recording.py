@@ -0,0 +1,321 @@
+import bisect
+import itertools
+import os
+import struct
+import threading
+import time
+import zlib
+
+import pipeline
+import protocol
+
+"""
+Append-only recording and seekable replay of the visualization stream.
+
+A recording consists of a segment file with the raw websocket messages and an index file next to it:
+
+    segment     magic "MVREC" and version u8, then per message:
+                tick i64 (-1 before the first tick), seconds since the start f64, flags u8 (bit 0: binary frame,
+                bits 1-7: feed index), payload length u32, zlib compressed payload
+    index       per entry: kind u8, tick i64, segment offset u64
+
+Both files are only appended to, so a recording that was interrupted stays readable up to its last complete
+message, and a missing or damaged index is rebuilt from the segment. The index holds the first message of every
+tick (KIND_TICK) and every message that carries state which later ticks depend on, such as vector and raster
+layers or a changed world size or max ticks of its feed (KIND_STATE). Seeking to a tick is a binary search over the
+tick entries. The state messages before it are merged into a few messages with only the latest world size, max
+ticks and layer of every type key of each feed, which are applied first; entity deltas recover with the next keyframe.
+"""
+
+MAGIC = b"MVREC\x01"
+
+KIND_TICK = 0
+KIND_STATE = 1
+
+FLAG_BINARY = 0x01
+FEED_SHIFT = 1
+MAX_FEEDS = 128
+
+_RECORD = struct.Struct("<qdBI")
+_INDEX_ENTRY = struct.Struct("<BqQ")
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def is_state_frame(data):
+    """ True for messages that later ticks depend on and that are not superseded by newer ticks. """
+    return pipeline.frame_key(data) is None and "delta" not in data and \
+        not any(getattr(columns, "delta", False) for columns in data.get("entityColumns", {}).values())
+
+
+def state_changed(last_state, data):
+    """ True if a message changes the world size or max ticks of its feed, last_state holds them per feed. """
+    state = last_state.setdefault(data.get("feed", 0), {})
+    changed = False
+    for name in pipeline.STICKY_KEYS:
+        if name in data and state.get(name) != data[name]:
+            state[name] = data[name]
+            changed = True
+    return changed
+
+
+def compact_state(messages):
+    """
+    Merges state messages into the few messages that hold only their latest state: the world size and max ticks of
+    every feed, the last vector layer and raster of every type key and the vector layers whose last change was a
+    removal. The layers keep the order in which the scene would hold them after applying all messages.
+    """
+    sticky, removed, vectors, rasters = {}, {}, {}, {}
+    untyped = itertools.count()
+    for data in messages:
+        feed = data.get("feed", 0)
+        sticky.setdefault(feed, {}).update((name, data[name]) for name in pipeline.STICKY_KEYS if name in data)
+        removed_keys = removed.setdefault(feed, {})
+        for layer in data.get("vectors", ()):
+            # layers without a type key are only removed together, see VectorRegistry.evict
+            type_key = layer["t"] if "f" in layer and "t" in layer else -1
+            key = feed, type_key if type_key != -1 else ("untyped", next(untyped))
+            vectors.pop(key, None)
+            vectors[key] = layer
+            removed_keys.pop(type_key, None)
+        for type_key in data.get("removedVectors", ()):
+            for key in [key for key in vectors if key[0] == feed and (key[1] == type_key or
+                                                                      type_key == -1 and isinstance(key[1], tuple))]:
+                del vectors[key]
+            removed_keys[type_key] = True
+        for raster in data.get("rasters", ()):
+            rasters[feed, raster["t"]] = raster
+
+    for feed, state in sticky.items():
+        if removed[feed]:
+            state["removedVectors"] = list(removed[feed])
+        if state:
+            yield dict(state, feed=feed)
+    yield from _feed_runs("vectors", vectors)
+    yield from _feed_runs("rasters", rasters)
+
+
+def _feed_runs(name, layers):
+    """ One message per run of consecutive layers of the same feed, layers is keyed by feed and type key. """
+    for feed, run in itertools.groupby(layers.items(), key=lambda item: item[0][0]):
+        yield {"feed": feed, name: [layer for _, layer in run]}
+
+
+def _read_record(segment):
+    """ Tick, timestamp, raw message and feed of the record at the position of a segment, None if it is incomplete. """
+    header = segment.read(_RECORD.size)
+    if len(header) < _RECORD.size:
+        return None
+    tick, timestamp, flags, length = _RECORD.unpack(header)
+    compressed = segment.read(length)
+    if len(compressed) < length:
+        return None
+    payload = zlib.decompress(compressed)
+    message = payload if flags & FLAG_BINARY else payload.decode("utf-8")
+    return tick, timestamp, message, flags >> FEED_SHIFT
+
+
+def decode(message, feed=0):
+    """ Decodes a recorded message and tags it with its feed like the receiver does. """
+    data = protocol.decode_message(message)
+    data["feed"] = feed
+    return data
+
+
+class Recorder:
+    def __init__(self, path, compression_level=1):
+        # the ticks and timestamps of a new run would start again below those already recorded
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            raise ValueError("%s already exists, a recording can not be continued by another run" % path)
+        self.path = path
+        self.compression_level = compression_level
+        self._segment = open(path, "wb")
+        self._segment.write(MAGIC)
+        self._started = time.perf_counter()
+        self._tick = -1
+        self._last_indexed_tick = None
+        self._last_state = {}
+        self._index = open(index_path(path), "wb")
+        # the receiver threads of all feeds append to the same recording
+        self._lock = threading.Lock()
+
+    def append(self, message, data):
+        """ Appends a raw websocket message together with its decoded form, which is used for the index. """
+        binary = isinstance(message, (bytes, bytearray, memoryview))
+        feed = data.get("feed", 0)
+        if not 0 <= feed < MAX_FEEDS:
+            raise ValueError("a recording holds at most %d feeds" % MAX_FEEDS)
+        payload = bytes(message) if binary else message.encode("utf-8")
+        compressed = zlib.compress(payload, self.compression_level)
+
+        with self._lock:
+            self._tick = data.get("currentTick", self._tick)
+            offset = self._segment.tell()
+            if self._tick != self._last_indexed_tick and (self._last_indexed_tick is None or
+                                                          self._tick > self._last_indexed_tick):
+                self._flush()
+                self._index.write(_INDEX_ENTRY.pack(KIND_TICK, self._tick, offset))
+                self._last_indexed_tick = self._tick
+            if state_changed(self._last_state, data) or is_state_frame(data):
+                self._index.write(_INDEX_ENTRY.pack(KIND_STATE, self._tick, offset))
+
+            self._segment.write(_RECORD.pack(self._tick, time.perf_counter() - self._started,
+                                             (FLAG_BINARY if binary else 0) | feed << FEED_SHIFT, len(compressed)))
+            self._segment.write(compressed)
+
+    def _flush(self):
+        self._segment.flush()
+        self._index.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._segment.close()
+            self._index.close()
+
+
+class Recording:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as segment:
+            if segment.read(len(MAGIC)) != MAGIC:
+                raise protocol.FrameFormatError("%s is not a visualization recording" % path)
+        self.ticks = []
+        self.tick_offsets = []
+        self.state_offsets = []
+        if not self._load_index():
+            self._rebuild_index()
+
+    @property
+    def first_tick(self):
+        return self.ticks[0] if self.ticks else 0
+
+    @property
+    def last_tick(self):
+        return self.ticks[-1] if self.ticks else 0
+
+    def _load_index(self):
+        if not os.path.exists(index_path(self.path)):
+            return False
+        segment_size = os.path.getsize(self.path)
+        with open(index_path(self.path), "rb") as index:
+            content = index.read()
+        for position in range(0, len(content) - _INDEX_ENTRY.size + 1, _INDEX_ENTRY.size):
+            kind, tick, offset = _INDEX_ENTRY.unpack_from(content, position)
+            if offset >= segment_size:
+                break
+            if kind == KIND_TICK:
+                self.ticks.append(tick)
+                self.tick_offsets.append(offset)
+            elif kind == KIND_STATE:
+                self.state_offsets.append(offset)
+            else:
+                break
+        if not self.ticks and segment_size > len(MAGIC):
+            self.state_offsets.clear()
+            return False
+        return True
+
+    def _rebuild_index(self):
+        last_tick = None
+        last_state = {}
+        for offset, tick, _, message, feed in self.records():
+            if last_tick is None or tick > last_tick:
+                self.ticks.append(tick)
+                self.tick_offsets.append(offset)
+                last_tick = tick
+            data = decode(message, feed)
+            if state_changed(last_state, data) or is_state_frame(data):
+                self.state_offsets.append(offset)
+
+    def records(self, offset=len(MAGIC)):
+        """ Yields offset, tick, timestamp, raw message and feed of the complete records from offset on. """
+        with open(self.path, "rb") as segment:
+            segment.seek(offset)
+            while True:
+                record = _read_record(segment)
+                if record is None:
+                    return
+                yield (offset,) + record
+                offset = segment.tell()
+
+    def offset_for(self, tick):
+        """ Segment offset of the first message of the latest indexed tick not after the given one. """
+        position = bisect.bisect_right(self.ticks, tick) - 1
+        return self.tick_offsets[max(position, 0)] if self.tick_offsets else len(MAGIC)
+
+    def state_records(self, before_offset):
+        """ The state messages recorded before an offset, which are needed to show the ticks after it. """
+        with open(self.path, "rb") as segment:
+            for offset in self.state_offsets[:bisect.bisect_left(self.state_offsets, before_offset)]:
+                segment.seek(offset)
+                record = _read_record(segment)
+                if record is None:
+                    return
+                yield (offset,) + record
+
+    def state_messages(self, before_offset):
+        """ The state of the messages recorded before an offset, merged per feed by compact_state. """
+        return compact_state(decode(message, feed) for _, _, _, message, feed in self.state_records(before_offset))
+
+    def messages(self, start_tick=None):
+        """ Decoded messages from start_tick on, preceded by the state messages recorded before it. """
+        if start_tick is None:
+            for _, _, _, message, feed in self.records():
+                yield decode(message, feed)
+            return
+        offset = self.offset_for(start_tick)
+        yield from self.state_messages(offset)
+        for _, _, _, message, feed in self.records(offset):
+            yield decode(message, feed)
+
+
+class Replayer:
+    """ Plays a recording into a frame queue at a given speed, 0 plays as fast as possible. """
+
+    def __init__(self, recording, speed=1.0):
+        self.recording = recording
+        self.speed = speed
+        self.tick = recording.first_tick
+        self._seek_tick = None
+
+    def seek(self, tick):
+        self._seek_tick = min(max(tick, self.recording.first_tick), self.recording.last_tick)
+
+    def set_speed(self, speed):
+        self.speed = max(speed, 0.0)
+
+    def play(self, frames, is_running, start_tick=None):
+        """ Plays until is_running() turns false, at the end of the recording it waits for the next seek. """
+        self._seek_tick = start_tick
+        while is_running():
+            start_tick, self._seek_tick = self._seek_tick, None
+            if start_tick is not None:
+                frames.put({"reset": True})
+            self._play_from(frames, is_running, start_tick)
+            while is_running() and self._seek_tick is None:
+                time.sleep(0.05)
+
+    def _play_from(self, frames, is_running, start_tick):
+        offset = len(MAGIC) if start_tick is None else self.recording.offset_for(start_tick)
+        for data in self.recording.state_messages(offset):
+            frames.put(data)
+
+        base_wall, base_timestamp, speed = None, None, None
+        for _, tick, timestamp, message, feed in self.recording.records(offset):
+            if not is_running() or self._seek_tick is not None:
+                return
+            if speed != self.speed or base_wall is None:
+                base_wall, base_timestamp, speed = time.perf_counter(), timestamp, self.speed
+            if speed > 0:
+                delay = base_wall + (timestamp - base_timestamp) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.tick = tick
+            frames.put(decode(message, feed))
@@ -0,0 +1,166 @@
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+import protocol
+import recording
+from scene import Scene
+
+"""
+Headless renderer that turns a recorded visualization stream into numbered PNG images or a raw video stream.
+
+It draws with the same Scene as the interactive window, but on off-screen surfaces and as fast as the CPU allows,
+so it also runs on batch nodes without a display. One image is written per tick, after all messages of that tick
+were applied.
+
+Input:
+- A recording written by main.py --record (see recording.py), or
+- a JSON lines file with one websocket message of the simulation per line.
+
+Output:
+- "<output>/frame_<tick>.png" for every rendered tick, or
+- raw RGB24 frames on stdout or a file (--raw), e.g. for
+  python3 render.py run.jsonl --raw - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x800 -r 30 -i - run.mp4
+
+With --processes the tick range is split into consecutive parts, rendered by separate processes. Each process
+replays the stream from its beginning, because vector layers and entity deltas depend on earlier messages, but
+only draws the ticks of its own part.
+"""
+
+_TICK_PATTERN = re.compile(r'"currentTick"\s*:\s*(\d+)')
+
+
+def is_recording(path):
+    with open(path, "rb") as file:
+        return file.read(len(recording.MAGIC)) == recording.MAGIC
+
+
+def read_messages(path):
+    """ Decoded messages of a recorded stream from its beginning. """
+    if is_recording(path):
+        yield from recording.Recording(path).messages()
+        return
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield protocol.decode_message(line)
+
+
+def tick_range(path):
+    """ First and last tick of a recorded stream, found without decoding the messages. """
+    if is_recording(path):
+        indexed = recording.Recording(path)
+        return indexed.first_tick, indexed.last_tick
+    ticks = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            match = _TICK_PATTERN.search(line)
+            if match:
+                ticks.append(int(match.group(1)))
+    return (min(ticks), max(ticks)) if ticks else (0, 0)
+
+
+def ticks(messages):
+    """ Yields every tick with its messages, messages without a tick belong to the current one. """
+    current_tick = None
+    pending = []
+    for data in messages:
+        tick = data.get("currentTick", current_tick)
+        if tick != current_tick and pending:
+            yield current_tick, pending
+            pending = []
+        current_tick = tick
+        pending.append(data)
+    if pending:
+        yield current_tick, pending
+
+
+def render_range(path, window_size, first_tick, last_tick, output_directory=None, raw_output=None, density=False):
+    """ Renders the ticks first_tick..last_tick (inclusive, None for open ends), returns the number of frames. """
+    pygame.font.init()
+    scene = Scene(window_size)
+    scene.density.enabled = density
+    surface = pygame.Surface(window_size)
+    rendered = 0
+
+    # entity deltas only apply on top of the earlier messages, which are applied without drawing them
+    for tick, messages in ticks(read_messages(path)):
+        for data in messages:
+            scene.apply_frame(data)
+        if tick is None or (first_tick is not None and tick < first_tick):
+            continue
+        if last_tick is not None and tick > last_tick:
+            break
+
+        scene.publish()
+        scene.render(surface)
+        if output_directory is not None:
+            pygame.image.save(surface, os.path.join(output_directory, f"frame_{tick:06d}.png"))
+        if raw_output is not None:
+            raw_output.write(pygame.image.tostring(surface, "RGB"))
+        rendered += 1
+
+    return rendered
+
+
+def _render_part(arguments):
+    return render_range(*arguments)
+
+
+def split_range(first_tick, last_tick, parts):
+    size = max(1, -(-(last_tick - first_tick + 1) // parts))
+    return [(start, min(start + size - 1, last_tick)) for start in range(first_tick, last_tick + 1, size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a recorded visualization stream without a display.")
+    parser.add_argument("input", help="Recording or JSON lines file with one websocket message per line")
+    parser.add_argument("--output", help="Directory for the numbered PNG images")
+    parser.add_argument("--raw", help="Write raw RGB24 frames to this file, '-' for stdout")
+    parser.add_argument("--size", default="800x800", help="Image size as WIDTHxHEIGHT (default: 800x800)")
+    parser.add_argument("--start", type=int, help="First tick to render")
+    parser.add_argument("--end", type=int, help="Last tick to render")
+    parser.add_argument("--density", action="store_true", help="Draw the entity density overlay")
+    parser.add_argument("--processes", type=int, default=1, help="Number of rendering processes (PNG output only)")
+    args = parser.parse_args()
+
+    if args.output is None and args.raw is None:
+        parser.error("either --output or --raw is required")
+    if args.raw is not None and args.processes > 1:
+        parser.error("--raw writes one ordered stream and can not be combined with --processes")
+    window_size = tuple(int(value) for value in args.size.lower().split("x"))
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+
+    if args.processes > 1:
+        first_tick, last_tick = tick_range(args.input)
+        first_tick = args.start if args.start is not None else first_tick
+        last_tick = args.end if args.end is not None else last_tick
+        parts = [(args.input, window_size, start, end, args.output, None, args.density)
+                 for start, end in split_range(first_tick, last_tick, args.processes)]
+        with multiprocessing.Pool(len(parts)) as pool:
+            rendered = sum(pool.map(_render_part, parts))
+    elif args.raw is not None:
+        raw_output = sys.stdout.buffer if args.raw == "-" else open(args.raw, "wb")
+        try:
+            rendered = render_range(args.input, window_size, args.start, args.end, args.output, raw_output,
+                                    args.density)
+        finally:
+            if raw_output is not sys.stdout.buffer:
+                raw_output.close()
+    else:
+        rendered = render_range(args.input, window_size, args.start, args.end, args.output, density=args.density)
+
+    print(f"Rendered {rendered} frames", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
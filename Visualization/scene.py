@@ -0,0 +1,271 @@
+from collections import namedtuple
+
+import pygame
+
+from density_layer import DensityLayer
+from entity_store import EntityStore, ScreenPositions
+from frame_timing import FrameTimings
+from glyph_cache import GlyphCache, LabelPlacer
+from point_sprites import draw_points
+from projection import Projection
+from raster_layer import RasterImage
+from vector_registry import VectorRegistry, VectorSet
+
+"""
+World state of the visualization and the drawing of it into a surface.
+
+The scene is shared by the interactive window (main.py) and the headless renderer (render.py), so both apply
+frames and draw them with the same code. It does not need a display, only an initialized pygame font module.
+
+The world state is double-buffered. Frames are applied to the working state by one thread, which then publishes a
+SceneSnapshot by replacing a single reference. Drawing reads only the published snapshot, so it never sees a
+partially applied frame and neither side waits for the other. Snapshots are cheap, because entity layers, raster
+images and vector sets are never modified once they were built, so a snapshot shares them with the working state.
+
+Frames may come from several feeds (see feeds.py). Entities and raster layers are stored under (feed, type key),
+vector layers per feed, and the world is the union of the world sizes of all feeds.
+"""
+
+GRAY = (100, 100, 100)
+NAVYBLUE = (60, 60, 100)
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0, 80)
+BLUE = (0, 0, 255)
+YELLOW = (255, 255, 0)
+ORANGE = (255, 128, 0)
+PURPLE = (255, 0, 255)
+CYAN = (0, 255, 255)
+BLACK = (0, 0, 0)
+
+GREEN_LIGHT = [149, 217, 104, 50]
+YELLOW_LIGHT = [205, 217, 104, 50]
+PURPLE_LIGHT = [162, 134, 222, 50]
+BLUE_LIGHT = [174, 218, 233, 50]
+
+RASTER_COLORS = [GREEN_LIGHT, YELLOW_LIGHT, PURPLE_LIGHT, BLUE_LIGHT]
+VECTOR_COLORS = [RED, WHITE, BLUE, ORANGE, YELLOW]
+# COLORS = [NAVYBLUE, RED, WHITE, BLUE, ORANGE, PURPLE, CYAN]  # without WHITE for background
+
+COLORS = VECTOR_COLORS
+
+SceneSnapshot = namedtuple("SceneSnapshot",
+                           ["tick", "max_ticks", "world_size", "entities", "vectors", "rasters", "density",
+                            "applied_ticks"],
+                           defaults=[None, None])
+
+
+class Scene:
+    def __init__(self, window_size=(800, 800), font=None, timings=None):
+        self.WINDOW_SIZE = list(window_size)
+        self.WORLD_SIZE = 0, 0, 100, 100  # used for scaling
+        self.world_sizes = {}
+        self.BORDER_WIDTH_PIXEL = -20
+        self.font = font or pygame.font.Font('freesansbold.ttf', 12)
+        self.glyphs = GlyphCache(self.font)
+        self.timings = timings or FrameTimings()
+
+        self.entities = EntityStore()
+        self.vectors = VectorRegistry()
+        self.raster_layers = {}
+        self.density = DensityLayer()
+        self.tick_display = [False, 0, 1000]
+        # (feed, type key) of the entity types whose deltas could not be applied, until their next keyframe
+        self.keyframes_needed = set()
+        # number of distinct ticks applied per feed, so drawing can tell how many it never showed
+        self.applied_ticks = {}
+        self.feed_ticks = {}
+        self.snapshot = SceneSnapshot(0, 1000, tuple(self.WORLD_SIZE), {}, VectorSet(), ())
+
+        # view state, only used by the drawing thread
+        self.projection = None
+        self.zoom = 1.0
+        self.pan = (0.0, 0.0)
+        self.positions = ScreenPositions()
+        self.static_layer = None
+        self.static_layer_key = None
+
+    def get_projection(self, world_size=None):
+        world_size = world_size or self.snapshot.world_size
+        key = (tuple(world_size), tuple(self.WINDOW_SIZE), self.BORDER_WIDTH_PIXEL, self.zoom, self.pan)
+        if self.projection is None or self.projection.key != key:
+            self.projection = Projection(world_size, self.WINDOW_SIZE, self.BORDER_WIDTH_PIXEL, self.zoom, self.pan)
+        return self.projection
+
+    def publish(self):
+        """ Makes the applied frames visible to drawing, returns the published snapshot. """
+        entities = self.entities.snapshot()
+        density = None
+        if self.density.enabled:
+            density = self.density.update(self.WORLD_SIZE, entities.values())
+        elif self.density.grid is not None:
+            self.density.reset()
+        snapshot = SceneSnapshot(self.tick_display[1], self.tick_display[2], tuple(self.WORLD_SIZE), entities,
+                                 self.vectors.snapshot(), tuple(self.raster_layers.values()), density,
+                                 dict(self.applied_ticks))
+        self.snapshot = snapshot
+        return snapshot
+
+    def reset(self, feed=None):
+        """ Forgets the entities of a feed (or of all feeds), e.g. after the connection to it was lost. """
+        if feed is None:
+            self.entities.clear()
+            self.keyframes_needed.clear()
+        else:
+            self.entities.clear(lambda key: key[0] == feed)
+            self.keyframes_needed -= {key for key in self.keyframes_needed if key[0] == feed}
+
+    def apply_frame(self, data):
+        """
+        Applies a decoded frame to the working state, adds its type to keyframes_needed if an entity delta could
+        not be applied. The frame is drawn after the next publish().
+        """
+        feed = data.get("feed", 0)
+        if "currentTick" in data:
+            if self.feed_ticks.get(feed) != data["currentTick"]:
+                self.feed_ticks[feed] = data["currentTick"]
+                self.applied_ticks[feed] = self.applied_ticks.get(feed, 0) + 1
+            # the tick every feed has reached, so the display does not jump between feeds that are apart
+            self.tick_display[1] = min(self.feed_ticks.values())
+        if "maxTicks" in data:
+            self.tick_display[2] = data["maxTicks"]
+
+        if "entities" in data:
+            entities_points = data["entities"]
+            self.entities.set_dicts((feed, data['t']), entities_points, data.get("seq"))
+            self.keyframes_needed.discard((feed, data['t']))
+        if "delta" in data:
+            if not self.entities.apply_json_delta((feed, data['t']), data["delta"], data.get("seq")):
+                self.keyframes_needed.add((feed, data['t']))
+        if "entityColumns" in data:
+            for type_key, columns in data["entityColumns"].items():
+                if not self.entities.set_columns((feed, type_key), columns):
+                    self.keyframes_needed.add((feed, type_key))
+                elif not columns.delta:
+                    self.keyframes_needed.discard((feed, type_key))
+        if "worldSize" in data:
+            world_data = data["worldSize"]
+            if world_data["maxX"] > 0:
+                self.world_sizes[feed] = world_data["minX"], world_data["minY"], world_data["maxX"], world_data["maxY"]
+                self.WORLD_SIZE = (min(size[0] for size in self.world_sizes.values()),
+                                   min(size[1] for size in self.world_sizes.values()),
+                                   max(size[2] for size in self.world_sizes.values()),
+                                   max(size[3] for size in self.world_sizes.values()))
+        if "vectors" in data:
+            layers_data = data["vectors"]
+            for layer in layers_data:
+                if "f" in layer and "t" in layer:
+                    features = layer["f"]
+                    type_key = layer["t"]
+                    self.load_vector_data(features, type_key, layer.get("h"), feed)
+                else:
+                    self.load_vector_data(layer, -1, feed=feed)
+        if "removedVectors" in data:
+            for type_key in data["removedVectors"]:
+                self.vectors.evict(type_key, feed)
+
+        if "rasters" in data:
+            raster_data = data["rasters"]
+            for raster in raster_data:
+                proxy_key = raster["t"]
+                self.raster_layers[feed, proxy_key] = RasterImage(raster,
+                                                                  RASTER_COLORS[proxy_key % len(RASTER_COLORS)])
+
+        self.tick_display[0] = True
+
+    def load_vector_data(self, features, type_key, layer_hash=None, feed=0):
+        self.vectors.put(features, type_key, layer_hash, feed)
+
+    def render(self, surface=None, snapshot=None):
+        """ Draws the rasters, vector features and entities of a snapshot, by default the published one. """
+        snapshot = snapshot or self.snapshot
+        projection = self.get_projection(snapshot.world_size)
+
+        # line_width = int((scale_x + scale_y) / 2)
+        line_width = 1
+
+        if surface is None:
+            surface = pygame.Surface(self.WINDOW_SIZE)
+        else:
+            surface.fill(BLACK)
+
+        with self.timings.measure("raster"):
+            for raster_image in snapshot.rasters:
+                scaled = raster_image.scaled(projection)
+                if scaled is not None:
+                    surface.blit(*scaled)
+
+        with self.timings.measure("vector"):
+            surface.blit(self.get_static_layer(snapshot.vectors, projection, line_width), (0, 0))
+
+        if snapshot.density is not None:
+            with self.timings.measure("density"):
+                scaled = snapshot.density.scaled(projection)
+                if scaled is not None:
+                    surface.blit(*scaled)
+
+        with self.timings.measure("entity"):
+            self.draw_entities(surface, snapshot, projection, line_width)
+
+        return surface
+
+    def draw_entities(self, surface, snapshot, projection, line_width):
+        labels = LabelPlacer(self.WINDOW_SIZE, self.font.get_linesize())
+        self.positions.retain(snapshot.entities)
+        for key, layer in snapshot.entities.items():
+            _, type_key = key
+            color = COLORS[type_key % len(COLORS)]
+            indices, xs, ys = self.positions.visible(key, layer, projection, line_width)
+
+            draw_points(surface, xs, ys, color, line_width)
+
+            # access the property values of each agent using layer.attributes
+            if layer.attributes:
+                self.draw_labels(surface, labels, layer, indices, xs, ys)
+
+    def draw_labels(self, surface, labels, layer, indices, xs, ys):
+        """ Draws the property values of the visible entities, skipping labels that would overlap. """
+        for candidate in labels.candidates(xs, ys).tolist():
+            index = indices[candidate]
+            values = [values[index] for values in layer.attributes.values()]
+            text = ", ".join(str(value) for value in values if value is not None and value == value)
+            if not text:
+                continue
+            label = self.glyphs.render(text, WHITE)
+            x, y = xs[candidate], ys[candidate]
+            if labels.place(x, y, label.get_width(), label.get_height()):
+                surface.blit(label, (x, y))
+
+    def get_static_layer(self, vectors, projection, line_width):
+        """ Vector features rendered once into an off-screen surface, black pixels are transparent. """
+        key = (projection.key, vectors.version, line_width)
+        if self.static_layer is not None and self.static_layer_key == key:
+            return self.static_layer
+
+        static_surface = pygame.Surface(self.WINDOW_SIZE)
+        static_surface.set_colorkey(BLACK)
+        bounds = projection.visible_bounds(line_width)
+        # a simplification error below half a pixel is invisible
+        tolerance = 0.5 / max(abs(projection.scale_x), abs(projection.scale_y))
+
+        for geometry_type in ("MultiPolygon", "Polygon"):
+            for buffer, positions in vectors.visible(geometry_type, bounds, tolerance):
+                for pointlist in buffer.screen_rings(projection, positions):
+                    pygame.draw.polygon(static_surface, GREEN, pointlist, 0)
+
+        for buffer, positions in vectors.visible("LineString", bounds, tolerance):
+            for line_feature in buffer.screen_rings(projection, positions):
+                pygame.draw.lines(static_surface, PURPLE, False, line_feature, line_width)
+
+        for buffer, positions in vectors.visible("LineRing", bounds, tolerance):
+            for pointlist in buffer.screen_rings(projection, positions):
+                pygame.draw.polygon(static_surface, ORANGE, pointlist, line_width)
+
+        for geometry_type in ("Point", "MultiPoint"):
+            for buffer, positions in vectors.visible(geometry_type, bounds, tolerance):
+                xs, ys = buffer.screen_vertices(projection, positions)
+                draw_points(static_surface, xs, ys, BLUE, line_width)
+
+        self.static_layer = static_surface
+        self.static_layer_key = key
+        return static_surface
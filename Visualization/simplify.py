@@ -0,0 +1,66 @@
+import numpy as np
+
+"""
+Douglas-Peucker simplification of line and ring coordinates for zoom dependent level of detail.
+
+All rings of a geometry buffer are simplified together: every pass handles the open segments of all rings at once,
+so the number of numpy calls grows with the depth of the subdivision and not with the number of rings.
+"""
+
+
+def douglas_peucker(coordinates, ring_offsets, tolerance):
+    """
+    Mask of the vertices to keep: those deviating more than tolerance from the simplified line of their ring. The
+    first and last vertex of every ring are always kept.
+    """
+    xs, ys = np.ascontiguousarray(coordinates[:, 0]), np.ascontiguousarray(coordinates[:, 1])
+    keep = np.zeros(len(coordinates), dtype=bool)
+    starts, ends = ring_offsets[:-1], ring_offsets[1:] - 1
+    nonempty = ends >= starts
+    starts, ends = starts[nonempty], ends[nonempty]
+    keep[starts] = keep[ends] = True
+
+    while True:
+        open_segments = ends > starts + 1
+        starts, ends = starts[open_segments], ends[open_segments]
+        if len(starts) == 0:
+            return keep
+        # every inner vertex of a segment, with the segment it belongs to
+        counts = ends - starts - 1
+        firsts = np.cumsum(counts) - counts
+        segments = np.repeat(np.arange(len(starts)), counts)
+        inner = np.arange(counts.sum()) - firsts[segments] + starts[segments] + 1
+
+        segment_starts, segment_ends = starts[segments], ends[segments]
+        direction_x, direction_y = xs[segment_ends] - xs[segment_starts], ys[segment_ends] - ys[segment_starts]
+        offset_x, offset_y = xs[inner] - xs[segment_starts], ys[inner] - ys[segment_starts]
+        length = np.hypot(direction_x, direction_y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distances = np.abs(direction_x * offset_y - direction_y * offset_x) / length
+        degenerate = length == 0
+        distances[degenerate] = np.hypot(offset_x[degenerate], offset_y[degenerate])
+
+        # the first vertex with the largest distance of every segment
+        largest = np.maximum.reduceat(distances, firsts)
+        split_segments = np.flatnonzero(largest > tolerance)
+        candidates = np.flatnonzero((distances == largest[segments]) & (largest[segments] > tolerance))
+        candidate_segments = segments[candidates]
+        first_candidates = np.ones(len(candidates), dtype=bool)
+        first_candidates[1:] = candidate_segments[1:] != candidate_segments[:-1]
+        farthest = inner[candidates[first_candidates]]
+        keep[farthest] = True
+        starts = np.concatenate([starts[split_segments], farthest])
+        ends = np.concatenate([farthest, ends[split_segments]])
+
+
+def simplify_mask(coordinates, ring_offsets, tolerance, closed=False):
+    """ Mask of the vertices of the simplified rings, a closed ring never gets fewer than four points. """
+    keep = douglas_peucker(coordinates, ring_offsets, tolerance)
+    if closed:
+        counts = np.diff(ring_offsets)
+        kept = np.diff(np.concatenate([[0], np.cumsum(keep)])[ring_offsets])
+        for ring in np.flatnonzero((kept < 4) & (counts >= 4)).tolist():
+            start, count = int(ring_offsets[ring]), int(counts[ring])
+            keep[start:start + count] = False
+            keep[start + np.linspace(0, count - 1, 4).astype(np.intp)] = True
+    return keep
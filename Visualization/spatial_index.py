@@ -0,0 +1,47 @@
+import math
+
+"""
+Uniform grid index over bounding boxes, used to find the features that intersect the visible part of the world.
+"""
+
+
+def intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GridIndex:
+    def __init__(self, bounds, cells_per_axis=64):
+        self.bounds = bounds
+        self.cells_per_axis = cells_per_axis
+        self.cell_width = max((bounds[2] - bounds[0]) / cells_per_axis, 1e-9)
+        self.cell_height = max((bounds[3] - bounds[1]) / cells_per_axis, 1e-9)
+        self._cells = {}
+        self._boxes = []
+
+    def _cell_range(self, box):
+        first_x = min(max(math.floor((box[0] - self.bounds[0]) / self.cell_width), 0), self.cells_per_axis - 1)
+        last_x = min(max(math.floor((box[2] - self.bounds[0]) / self.cell_width), 0), self.cells_per_axis - 1)
+        first_y = min(max(math.floor((box[1] - self.bounds[1]) / self.cell_height), 0), self.cells_per_axis - 1)
+        last_y = min(max(math.floor((box[3] - self.bounds[1]) / self.cell_height), 0), self.cells_per_axis - 1)
+        return range(first_x, last_x + 1), range(first_y, last_y + 1)
+
+    def insert(self, box):
+        """ Adds a bounding box and returns its item number. """
+        item = len(self._boxes)
+        self._boxes.append(box)
+        columns, rows = self._cell_range(box)
+        for column in columns:
+            for row in rows:
+                self._cells.setdefault((column, row), []).append(item)
+        return item
+
+    def query(self, box):
+        """ Item numbers of all boxes intersecting the given box, in insertion order. """
+        if not intersects(box, self.bounds):
+            return []
+        found = set()
+        columns, rows = self._cell_range(box)
+        for column in columns:
+            for row in rows:
+                found.update(self._cells.get((column, row), ()))
+        return sorted(item for item in found if intersects(self._boxes[item], box))
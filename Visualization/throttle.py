@@ -0,0 +1,112 @@
+import time
+
+"""
+Closed-loop control of the simulation pace from the load of the viewer.
+
+The controller watches how many frames wait in the receive queue, how many were coalesced (replaced by a newer
+frame or snapshot before they were drawn) since its last update and how long a frame takes to render on average.
+Waiting or coalesced frames, or frames that take longer than the budget of the desired FPS, mean that the
+simulation overruns the viewer, which then backs off multiplicatively: first the simulation waits longer between
+ticks (timeToWaitInMilliseconds), and once that reached max_wait_ms it is asked to send only every Nth tick
+(frameInterval). While the queue stays empty and frames render within the budget for a few updates in a row, the
+frame interval is reduced first and then the wait time, so the simulation runs as fast as the viewer can show it.
+Updates are at least interval seconds apart, so the effect of a change is measured before the next one.
+"""
+
+STEADY = "steady"
+BACKING_OFF = "backing off"
+SPEEDING_UP = "speeding up"
+
+
+class ThrottleController:
+    def __init__(self, time_to_wait_ms=10, enabled=True, interval=0.5, max_wait_ms=500, max_frame_interval=32,
+                 high_water=4, low_water=1, calm_updates=3):
+        self.enabled = enabled
+        self.time_to_wait_ms = time_to_wait_ms
+        self.frame_interval = 1
+        self.state = STEADY
+        self.interval = interval
+        self.max_wait_ms = max_wait_ms
+        self.max_frame_interval = max_frame_interval
+        self.high_water = high_water
+        self.low_water = low_water
+        self.calm_updates = calm_updates
+
+        self.render_ms = 0.0
+        self.queue_depth = 0
+        self.dropped = 0
+        self._render_total_ms = 0.0
+        self._rendered = 0
+        self._max_depth = 0
+        self._last_dropped = None
+        self._calm = 0
+        self._last_update = time.perf_counter()
+
+    def observe(self, render_ms, queue_depth, dropped_frames, budget_ms):
+        """
+        Records the measurements of a rendered frame. Returns the new time to wait and frame interval when the
+        controller changed them, otherwise None.
+        """
+        self._render_total_ms += render_ms
+        self._rendered += 1
+        self._max_depth = max(self._max_depth, queue_depth)
+        if self._last_dropped is None:
+            self._last_dropped = dropped_frames
+
+        now = time.perf_counter()
+        if now - self._last_update < self.interval:
+            return None
+        self._last_update = now
+        self.render_ms, self.queue_depth = self._render_total_ms / self._rendered, self._max_depth
+        self.dropped, self._last_dropped = dropped_frames - self._last_dropped, dropped_frames
+        self._render_total_ms, self._rendered, self._max_depth = 0.0, 0, 0
+        if not self.enabled:
+            return None
+
+        previous = self.time_to_wait_ms, self.frame_interval
+        if self.queue_depth >= self.high_water or self.dropped > 0 or self.render_ms > budget_ms:
+            self._calm = 0
+            self._back_off()
+        elif self.queue_depth <= self.low_water and self.render_ms < budget_ms:
+            self._calm += 1
+            self.state = STEADY
+            if self._calm >= self.calm_updates:
+                self._speed_up()
+        else:
+            self._calm = 0
+            self.state = STEADY
+
+        if (self.time_to_wait_ms, self.frame_interval) == previous:
+            return None
+        return self.time_to_wait_ms, self.frame_interval
+
+    def _back_off(self):
+        self.state = BACKING_OFF
+        if self.time_to_wait_ms < self.max_wait_ms:
+            self.time_to_wait_ms = min(self.max_wait_ms, int(self.time_to_wait_ms * 1.5) + 1)
+        elif self.frame_interval < self.max_frame_interval:
+            self.frame_interval *= 2
+
+    def _speed_up(self):
+        if self.frame_interval > 1:
+            self.frame_interval //= 2
+        elif self.time_to_wait_ms > 0:
+            self.time_to_wait_ms = max(0, self.time_to_wait_ms - max(2, self.time_to_wait_ms // 10))
+        else:
+            self.state = STEADY
+            return
+        self.state = SPEEDING_UP
+
+    def set_manual(self, time_to_wait_ms):
+        """ A manual speed change switches the controller off until it is enabled again. """
+        self.enabled = False
+        self.state = STEADY
+        self.time_to_wait_ms = max(0, time_to_wait_ms)
+        self.frame_interval = 1
+
+    def describe(self):
+        if not self.enabled:
+            return f"Throttle: manual, wait {self.time_to_wait_ms} ms"
+        decimation = f", every {self.frame_interval}. tick" if self.frame_interval > 1 else ""
+        return (f"Throttle: auto, wait {self.time_to_wait_ms} ms{decimation}, {self.state} "
+                f"(queue {self.queue_depth}, coalesced {self.dropped}, render {self.render_ms:.1f} ms)")
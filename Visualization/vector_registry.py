@@ -0,0 +1,185 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from geometry_buffer import GeometryBuffer
+from spatial_index import GridIndex
+
+"""
+Registry of the vector layers received from the simulation.
+
+Layers are keyed by their feed and type key, so a layer that is sent again replaces its previous version instead
+of being appended. Layers without a type key are keyed by their content hash, which deduplicates identical resends. The
+hashes of the held layers can be reported to the simulation, so it does not need to send them again.
+
+Drawing reads a VectorSet, an unchanging snapshot of the layers held at one version. Its grid index over the
+bounding boxes of all geometries limits drawing to the geometries intersecting the visible part of the world.
+
+The geometries of a layer are converted once, when it arrives, into one columnar GeometryBuffer per geometry type
+(geometry_buffer.py). Lines, rings and polygons can be drawn simplified to several tolerances relative to the
+extent of their layer. Drawing asks for the coarsest level whose error stays below the size of a pixel; a level is
+simplified the first time a zoom needs it, so loading a layer does not delay the entity updates behind it.
+"""
+
+GEOMETRY_TYPES = ("Point", "MultiPoint", "LineString", "LineRing", "Polygon", "MultiPolygon")
+SIMPLIFIED_TYPES = ("LineString", "LineRing", "Polygon", "MultiPolygon")
+
+# Simplification tolerances of the detail levels as fractions of the layer extent, finest first.
+LEVEL_OF_DETAIL_FRACTIONS = (1 / 16384, 1 / 4096, 1 / 1024, 1 / 256)
+
+
+def content_hash(features):
+    encoded = json.dumps(features, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class VectorLayer:
+    def __init__(self, type_key, layer_hash, features, feed=0):
+        self.type_key = type_key
+        self.hash = layer_hash
+        self.feed = feed
+        geometries = {geometry_type: [] for geometry_type in GEOMETRY_TYPES}
+        for feature in features:
+            geometry = feature["geometry"]
+            if geometry["type"] in geometries:
+                geometries[geometry["type"]].append(geometry)
+        self.buffers = {geometry_type: GeometryBuffer.from_geometries(geometry_type, type_geometries)
+                        for geometry_type, type_geometries in geometries.items()}
+        self.bounds = {geometry_type: buffer.bounds() for geometry_type, buffer in self.buffers.items()}
+
+        boxes = np.concatenate(list(self.bounds.values()))
+        extent = max(boxes[:, 2].max() - boxes[:, 0].min(), boxes[:, 3].max() - boxes[:, 1].min()) if len(boxes) else 0
+        self.tolerances = [float(extent) * fraction for fraction in LEVEL_OF_DETAIL_FRACTIONS] if extent > 0 else []
+        self._levels = {(geometry_type, 0): buffer for geometry_type, buffer in self.buffers.items()}
+
+    def level_for(self, max_tolerance):
+        """ Index of the coarsest level whose tolerance does not exceed max_tolerance, 0 is the original data. """
+        level = 0
+        for index, tolerance in enumerate(self.tolerances):
+            if tolerance <= max_tolerance:
+                level = index + 1
+        return level
+
+    def level(self, geometry_type, max_tolerance):
+        """ Buffer of a geometry type at the coarsest level of detail within max_tolerance, built on first use. """
+        level = self.level_for(max_tolerance) if geometry_type in SIMPLIFIED_TYPES else 0
+        buffer = self._levels.get((geometry_type, level))
+        if buffer is None:
+            buffer = self.buffers[geometry_type].simplified(self.tolerances[level - 1])
+            self._levels[geometry_type, level] = buffer
+        return buffer
+
+
+class VectorSet:
+    """ The layers of a registry at one version, with a grid index built on first use. """
+
+    def __init__(self, version=0, layers=()):
+        self.version = version
+        self.layers = tuple(layers)
+        self._index = None
+
+    def __len__(self):
+        return len(self.layers)
+
+    def visible(self, geometry_type, bounds, max_tolerance=0.0):
+        """
+        Geometries of a type whose bounding box intersects the given world bounds, as a list of GeometryBuffer and
+        array of geometry positions in it per layer. The buffers are at the coarsest level of detail whose
+        simplification tolerance (in world units) does not exceed max_tolerance.
+        """
+        if self._index is None:
+            self._index = self._build_index()
+        if geometry_type not in self._index:
+            return []
+        grid, layers, first_items = self._index[geometry_type]
+        items = np.asarray(grid.query(bounds), dtype=np.int64)
+        if len(items) == 0:
+            return []
+        # items are in insertion order, so the items of a layer are consecutive
+        layer_indices = np.searchsorted(first_items, items, side="right") - 1
+        splits = np.flatnonzero(np.diff(layer_indices)) + 1
+        visible = []
+        for layer_items in np.split(items, splits):
+            layer_index = int(np.searchsorted(first_items, layer_items[0], side="right") - 1)
+            buffer = layers[layer_index].level(geometry_type, max_tolerance)
+            visible.append((buffer, layer_items - first_items[layer_index]))
+        return visible
+
+    def _build_index(self):
+        index = {}
+        for geometry_type in GEOMETRY_TYPES:
+            layers = [layer for layer in self.layers if len(layer.buffers[geometry_type])]
+            if not layers:
+                continue
+            boxes = np.concatenate([layer.bounds[geometry_type] for layer in layers])
+            first_items = np.cumsum([0] + [len(layer.buffers[geometry_type]) for layer in layers[:-1]])
+            minimum, maximum = boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)
+            grid = GridIndex((minimum[0], minimum[1], maximum[0], maximum[1]))
+            for box in boxes.tolist():
+                grid.insert(box)
+            index[geometry_type] = grid, layers, first_items
+        return index
+
+
+class VectorRegistry:
+    def __init__(self, max_layers=None):
+        self.max_layers = max_layers
+        self.version = 0
+        self._layers = OrderedDict()
+        self._lock = threading.Lock()
+        self._snapshot = VectorSet()
+
+    def __len__(self):
+        return len(self._layers)
+
+    @staticmethod
+    def _key(type_key, layer_hash, feed):
+        return (feed, type_key) if type_key != -1 else (feed, "untyped", layer_hash)
+
+    def put(self, features, type_key=-1, layer_hash=None, feed=0):
+        """ Adds or replaces a layer of a feed, returns False if the same content was already held. """
+        layer_hash = layer_hash or content_hash(features)
+        key = self._key(type_key, layer_hash, feed)
+        with self._lock:
+            held = self._layers.get(key)
+            if held is not None and held.hash == layer_hash:
+                self._layers.move_to_end(key)
+                return False
+            self._layers[key] = VectorLayer(type_key, layer_hash, features, feed)
+            self._layers.move_to_end(key)
+            if self.max_layers is not None:
+                while len(self._layers) > self.max_layers:
+                    self._layers.popitem(last=False)
+            self.version += 1
+        return True
+
+    def evict(self, type_key, feed=0):
+        """ Removes all layers of a type key of a feed, -1 removes the layers that were sent without a type key. """
+        with self._lock:
+            keys = [key for key, layer in self._layers.items() if layer.type_key == type_key and layer.feed == feed]
+            for key in keys:
+                del self._layers[key]
+            if keys:
+                self.version += 1
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            if self._layers:
+                self._layers.clear()
+                self.version += 1
+
+    def snapshot(self):
+        """ The held layers as a VectorSet, the same object as long as the layers do not change. """
+        with self._lock:
+            if self._snapshot.version != self.version:
+                self._snapshot = VectorSet(self.version, self._layers.values())
+            return self._snapshot
+
+    def known_layers(self, feed=0):
+        """ Type keys and hashes of the held layers of a feed, safe to call from the receiver thread. """
+        with self._lock:
+            return [{"t": layer.type_key, "h": layer.hash} for layer in self._layers.values() if layer.feed == feed]